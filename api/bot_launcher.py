@@ -1,112 +1,118 @@
 import sys
-import json
 import os
-from datetime import datetime, timezone
+import sqlite3
+import time
 from pathlib import Path
-from filelock import FileLock
+from typing import Optional
 
 # Fix import errors by adding project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from core.bot import MemeBot
 from core.config import load_config
+from core.market_data import BirdeyeMarketDataProvider
+from core.metrics import SESSION_BUCKETS, get_metrics
+from core.models import SessionResult
+from api.result_store import get_result_store
+from api.session_store import get_session_store
 
 # Constants
 BASE_PERSISTENT = Path("/var/data")
 RESULTS_FOLDER = BASE_PERSISTENT / "results"
-BOT_STATUS_FILE = BASE_PERSISTENT / "bot_status.json"
-LOCK_FILE = BASE_PERSISTENT / "bot_status.lock"
-SESSION_STATE_FILE = BASE_PERSISTENT / "session_state.json"
 
 
 # Ensure results directory exists
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
-def free_bot(bot_key: str):
-    with FileLock(LOCK_FILE):
-        if not os.path.exists(BOT_STATUS_FILE):
-            return
-        with open(BOT_STATUS_FILE, "r") as f:
-            status = json.load(f)
-        status[bot_key] = "FREE"
-        with open(BOT_STATUS_FILE, "w") as f:
-            json.dump(status, f, indent=4)
-
-def update_session_state(session_id: str, status: str):
-    try:
-        with open(SESSION_STATE_FILE, "r") as f:
-            states = json.load(f)
-    except FileNotFoundError:
-        states = {}
-    if session_id in states:
-        states[session_id]["status"] = status
-        states[session_id]["end_time"] = datetime.now(timezone.utc).isoformat()
-    with open(SESSION_STATE_FILE, "w") as f:
-        json.dump(states, f, indent=4)
-
-def main():
-    if len(sys.argv) != 5:
-        print("Usage: bot_launcher.py <wallet> <session_id> <config_file> <bot_key>")
-        sys.exit(1)
-
-    wallet = sys.argv[1]
-    session_id = sys.argv[2]
-    config_path = sys.argv[3]
-    bot_key = sys.argv[4]
-
-    print(f"Launching bot for session: {session_id}, bot_key: {bot_key}, wallet: {wallet}")
-
-    result = None
+def write_result(session_id: str, wallet: str, payload: dict):
+    get_result_store().save(session_id, wallet, payload)
 
+def publish_interim(session_id: str, result: SessionResult):
+    """Show a running session's partial result in its session status."""
+    summary = result.to_dict()
+    # Per-token detail is left for the final result
+    for key in ("aggregated_trades", "round_trips"):
+        summary.pop(key, None)
+    try:
+        get_session_store().update(session_id, interim_result=summary)
+    except sqlite3.Error as e:
+        print(f"Failed to publish interim result for {session_id}: {e}")
+
+def record_duration(kind: str, outcome: str, started: float):
+    get_metrics().observe(
+        "trench_session_duration_seconds", time.monotonic() - started,
+        buckets=SESSION_BUCKETS, kind=kind, outcome=outcome
+    )
+
+def run_session(
+    wallet: str,
+    session_id: str,
+    config_path: str,
+    price_provider: Optional[BirdeyeMarketDataProvider] = None,
+    timeout_secs: Optional[int] = 600
+) -> bool:
+    """Run one wallet session to completion, storing its result and final state."""
+    bot = None
+    started = time.monotonic()
     try:
         config = load_config(Path(config_path))
         bot = MemeBot(
             wallet_address=wallet,
             solanafm_key=config.solanafm_api_key,
             birdeye_key_file=config.birdeye_key_file,
-            session_id=session_id
+            config_path=config_path,
+            session_id=session_id,
+            price_provider=price_provider,
+            timeout_secs=timeout_secs,
+            on_interim=lambda interim: publish_interim(session_id, interim)
         )
 
         result = bot.run()
-
-        result_path = Path(RESULTS_FOLDER) / f"{wallet}.json"
+        # The log must be complete before the state says the session is over
+        bot.logger.flush()
 
         if result is not None:
-            with open(result_path, "w") as f:
-                json.dump(result.to_dict(), f, indent=4)
+            write_result(session_id, wallet, result.to_dict())
         else:
-            print("⚠️ Warning: bot.run() returned None. Writing fallback result file.")
-            fallback = {
+            print("⚠️ Warning: bot.run() returned None. Writing fallback result.")
+            write_result(session_id, wallet, {
                 "summary_stats": None,
                 "best_trades": [],
                 "worst_trades": [],
                 "errors": ["Bot.run() returned None. Possibly due to reused wallet or no valid trades."]
-            }
-            with open(result_path, "w") as f:
-                json.dump(fallback, f, indent=4)
+            })
 
-        update_session_state(session_id, "Completed")
+        get_session_store().transition(session_id, "Completed")
+        record_duration("session", "completed" if result is not None else "no_result", started)
         print(f"Session {session_id} completed successfully.")
+        return True
 
     except Exception as e:
         print(f"❌ Bot error during session {session_id}: {e}")
-        update_session_state(session_id, "Failed")
-        # Optionally: write a minimal error result file
-        result_path = Path(RESULTS_FOLDER) / f"{wallet}.json"
-        with open(result_path, "w") as f:
-            json.dump({
-                "summary_stats": None,
-                "best_trades": [],
-                "worst_trades": [],
-                "errors": [str(e)]
-            }, f, indent=4)
-
-    finally:
-        try:
-            free_bot(bot_key)
-            print(f"Bot {bot_key} released.")
-        except Exception as e:
-            print(f"Failed to release bot {bot_key}: {e}")
+        if bot is not None:
+            bot.logger.flush()
+        get_session_store().transition(session_id, "Failed")
+        record_duration("session", "failed", started)
+        # Minimal error result
+        write_result(session_id, wallet, {
+            "summary_stats": None,
+            "best_trades": [],
+            "worst_trades": [],
+            "errors": [str(e)]
+        })
+        return False
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: bot_launcher.py <wallet> <session_id> <config_file>")
+        sys.exit(1)
+
+    wallet = sys.argv[1]
+    session_id = sys.argv[2]
+    config_path = sys.argv[3]
+
+    print(f"Launching bot for session: {session_id}, wallet: {wallet}")
+    run_session(wallet, session_id, config_path)
 
 if __name__ == "__main__":
     main()
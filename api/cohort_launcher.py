@@ -0,0 +1,73 @@
+import sys
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+# Fix import errors by adding project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.cohort import CohortRunner
+from core.config import load_config
+from core.market_data import BirdeyeMarketDataProvider
+from api.bot_launcher import RESULTS_FOLDER, record_duration, write_result
+from api.session_store import get_session_store
+
+def run_cohort(
+    wallets: List[str],
+    cohort_id: str,
+    config_path: str,
+    price_provider: Optional[BirdeyeMarketDataProvider] = None
+) -> bool:
+    """Run a cohort to completion, writing per-wallet results, the leaderboard and final state."""
+    started = time.monotonic()
+    try:
+        config = load_config(Path(config_path))
+        runner = CohortRunner(
+            wallets,
+            solanafm_key=config.solanafm_api_key,
+            birdeye_key_file=config.birdeye_key_file,
+            config_path=config_path,
+            cohort_id=cohort_id,
+            price_provider=price_provider
+        )
+        cohort_result = runner.run()
+
+        # Per-wallet results stay available through /get_session_result_by_wallet and /results
+        for wallet, result in runner.results.items():
+            write_result(result.session_id, wallet, result.to_dict())
+
+        with open(Path(RESULTS_FOLDER) / f"cohort_{cohort_id}.json", "w") as f:
+            json.dump(cohort_result, f, indent=4)
+
+        get_session_store().transition(cohort_id, "Completed")
+        record_duration("cohort", "completed", started)
+        print(f"Cohort {cohort_id} completed successfully.")
+        return True
+
+    except Exception as e:
+        print(f"❌ Cohort error {cohort_id}: {e}")
+        get_session_store().transition(cohort_id, "Failed")
+        record_duration("cohort", "failed", started)
+        with open(Path(RESULTS_FOLDER) / f"cohort_{cohort_id}.json", "w") as f:
+            json.dump({"cohort_id": cohort_id, "leaderboard": [], "errors": {"cohort": str(e)}}, f, indent=4)
+        return False
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: cohort_launcher.py <wallets_file> <cohort_id> <config_file>")
+        sys.exit(1)
+
+    wallets_file = sys.argv[1]
+    cohort_id = sys.argv[2]
+    config_path = sys.argv[3]
+
+    print(f"Launching cohort: {cohort_id}")
+
+    with open(wallets_file, "r") as f:
+        wallets = json.load(f)
+    run_cohort(wallets, cohort_id, config_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+JOB_QUEUE_DB = "/var/data/jobs.db"
+# A running job whose worker misses heartbeats for this long is handed out again
+LEASE_SECS = 60
+MAX_ATTEMPTS = 3
+# Assumed job duration until enough jobs have finished to measure one
+DEFAULT_JOB_SECS = 120
+
+class JobQueue:
+    """
+    Durable FIFO of session and cohort jobs. Workers claim a job under a
+    lease and keep it alive with heartbeats; a job whose lease runs out
+    (crashed worker or process) goes back to the queue with the same id, so
+    capacity can never leak the way a never-freed bot slot did.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, lease_secs: int = LEASE_SECS):
+        self.db_path = db_path
+        self.lease_secs = lease_secs
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    wallet TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, enqueued_at)")
+            # At most one queued or running session per wallet
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_wallet ON jobs (wallet)
+                WHERE kind = 'session' AND status IN ('queued', 'running')
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, job_id: str, kind: str, payload: Dict):
+        self._connect().execute(
+            "INSERT INTO jobs (job_id, kind, payload, status, enqueued_at) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, kind, json.dumps(payload), time.time())
+        )
+
+    def enqueue_or_attach(self, job_id: str, wallet: str, payload: Dict) -> Tuple[str, bool]:
+        """
+        Queue a session for wallet unless one is already queued or running.
+        Returns the id callers should follow and whether it was an existing job.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE kind = 'session' AND wallet = ? AND status IN ('queued', 'running')",
+                (wallet,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, kind, wallet, payload, status, enqueued_at) VALUES (?, 'session', ?, ?, 'queued', ?)",
+                    (job_id, wallet, json.dumps(payload), time.time())
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is not None:
+            return row["job_id"], True
+        return job_id, False
+
+    def _reclaim_expired(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        """Re-queue expired jobs with attempts left and fail the rest, returning the failed job ids."""
+        conn.execute("""
+            UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL
+            WHERE status = 'running' AND lease_expires < ? AND attempts < ?
+        """, (now, MAX_ATTEMPTS))
+        failed = [row[0] for row in conn.execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND lease_expires < ?", (now,)
+        )]
+        conn.execute("""
+            UPDATE jobs SET status = 'failed', finished_at = ?
+            WHERE status = 'running' AND lease_expires < ?
+        """, (now, now))
+        return failed
+
+    def claim(self, worker_id: str) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Lease the oldest queued job to worker_id, reclaiming expired leases
+        first. Also returns the ids of jobs failed for running out of attempts,
+        so the caller can update their session state.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = self._reclaim_expired(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY enqueued_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute("""
+                    UPDATE jobs SET status = 'running', worker = ?, started_at = ?,
+                        lease_expires = ?, attempts = attempts + 1
+                    WHERE job_id = ?
+                """, (worker_id, now, now + self.lease_secs, row["job_id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None, failed
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        return job, failed
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False if the job was reclaimed from this worker."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_secs, job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, worker_id: str, status: str):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, lease_expires = NULL WHERE job_id = ? AND worker = ?",
+            (status, time.time(), job_id, worker_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place in the queue, or None once the job is no longer queued."""
+        row = self._connect().execute("""
+            SELECT COUNT(*) FROM jobs
+            WHERE status = 'queued' AND enqueued_at <= (
+                SELECT enqueued_at FROM jobs WHERE job_id = ? AND status = 'queued'
+            )
+        """, (job_id,)).fetchone()
+        return row[0] or None
+
+    def average_duration(self, sample: int = 20) -> float:
+        row = self._connect().execute("""
+            SELECT AVG(finished_at - started_at) FROM (
+                SELECT finished_at, started_at FROM jobs
+                WHERE status = 'completed' ORDER BY finished_at DESC LIMIT ?
+            )
+        """, (sample,)).fetchone()
+        return row[0] or DEFAULT_JOB_SECS
+
+    def eta_secs(self, job_id: str, workers: int) -> Optional[float]:
+        """Rough wait until the job starts: full rounds of the pool ahead of it."""
+        position = self.position(job_id)
+        if position is None:
+            return None
+        return round(((position - 1) // max(workers, 1) + 1) * self.average_duration(), 1)
+
+    def depth(self) -> Dict[str, int]:
+        """Queued jobs per kind."""
+        rows = self._connect().execute(
+            "SELECT kind, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY kind"
+        ).fetchall()
+        return {kind: count for kind, count in rows}
+
+    def running_by_worker(self) -> Dict[str, int]:
+        """Running jobs per worker, across every process sharing the queue."""
+        rows = self._connect().execute(
+            "SELECT worker, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY worker"
+        ).fetchall()
+        return {worker: count for worker, count in rows}
+
+    def queue_status(self, job_id: str, workers: int) -> Dict:
+        job = self.get(job_id)
+        if job is None:
+            return {}
+        status = {"job_status": job["status"], "attempts": job["attempts"]}
+        if job["status"] == "queued":
+            status["queue_position"] = self.position(job_id)
+            status["eta_secs"] = self.eta_secs(job_id, workers)
+        return status
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
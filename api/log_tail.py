@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Callable, List, Tuple
+
+# Largest slice read per call, so a huge backlog is sent in pieces
+MAX_CHUNK_BYTES = 64 * 1024
+POLL_SECS = 0.5
+KEEPALIVE_SECS = 15
+
+def read_log_chunk(path: str, offset: int, max_bytes: int = MAX_CHUNK_BYTES) -> Tuple[List[str], int]:
+    """
+    Complete lines written after byte `offset` and the offset to continue
+    from. A trailing partial line is left for the next call.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        if len(data) < max_bytes:
+            return [], offset
+        end = len(data)  # a single line longer than max_bytes
+    lines = data[:end].decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines, offset + end
+
+def read_full_log(path: str) -> Tuple[List[str], int]:
+    """Every line of the log, including a trailing partial one, and its size in bytes."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return data.decode("utf-8", errors="replace").splitlines(keepends=True), len(data)
+
+async def tail_log_events(
+    path: str,
+    offset: int,
+    is_finished: Callable[[], bool]
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for every new log line, each with its end offset as
+    the event id so a reconnecting client can resume via Last-Event-ID. The
+    file is polled off the event loop; the stream ends with a "done" event
+    once the session is finished and the log is drained.
+    """
+    idle = 0.0
+    while True:
+        lines = []
+        if os.path.exists(path):
+            lines, next_offset = await asyncio.to_thread(read_log_chunk, path, offset)
+        if lines:
+            position = offset
+            for line in lines:
+                position += len(line.encode("utf-8"))
+                data = json.dumps(line.rstrip("\r\n"))
+                yield f"id: {position}\ndata: {data}\n\n"
+            offset = next_offset
+            idle = 0.0
+            continue
+
+        if await asyncio.to_thread(is_finished):
+            yield f"event: done\nid: {offset}\ndata: {{}}\n\n"
+            return
+
+        await asyncio.sleep(POLL_SECS)
+        idle += POLL_SECS
+        if idle >= KEEPALIVE_SECS:
+            yield ": keepalive\n\n"
+            idle = 0.0
@@ -1,14 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timezone
+import asyncio
 import os
 import json
-import subprocess
-from filelock import FileLock
-import sys
 from pathlib import Path
+from typing import List, Optional
+
+from core.api_key_manager import key_quota
+from core.metrics import get_metrics
+from api.worker_pool import get_worker_pool
+from api.result_store import SORT_COLUMNS, get_result_store
+from api.session_store import FINISHED_STATUSES, get_session_store
+from api.log_tail import read_full_log, read_log_chunk, tail_log_events
+
 app = FastAPI()
 
 # ✅ CORS setup for your frontend domain
@@ -22,105 +30,221 @@ app.add_middleware(
 
 BASE_PERSISTENT = Path("/var/data")
 
-SESSION_STATE_FILE = BASE_PERSISTENT / "session_state.json"
 RESULTS_FOLDER = BASE_PERSISTENT / "results"
 LOGS_FOLDER = BASE_PERSISTENT / "logs"
-BOT_STATUS_FILE = BASE_PERSISTENT / "bot_status.json"
-LOCK_FILE = BASE_PERSISTENT / "bot_status.lock"
 
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 os.makedirs(LOGS_FOLDER, exist_ok=True)
 
-def load_session_states():
-    if os.path.exists(SESSION_STATE_FILE):
-        with open(SESSION_STATE_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_session_states(state):
-    with open(SESSION_STATE_FILE, "w") as f:
-        json.dump(state, f, indent=4)
-
-def assign_bot_config():
-    with FileLock(LOCK_FILE):
-        if not os.path.exists(BOT_STATUS_FILE):
-            with open(BOT_STATUS_FILE, "w") as f:
-                json.dump({"bot1": "FREE", "bot2": "FREE", "bot3": "FREE"}, f, indent=4)
-
-        with open(BOT_STATUS_FILE, "r") as f:
-            status = json.load(f)
-
-        for bot, state in status.items():
-            if state == "FREE":
-                status[bot] = "IN_USE"
-                with open(BOT_STATUS_FILE, "w") as f:
-                    json.dump(status, f, indent=4)
-                print(f"Assigned bot slot: {bot}")
-                return bot
+@app.on_event("startup")
+def start_workers():
+    # Picks up jobs queued before a restart right away
+    get_worker_pool()
 
-        return None
+@app.on_event("shutdown")
+def stop_workers():
+    get_worker_pool().shutdown()
 
 class StartSessionRequest(BaseModel):
     wallet: str
 
 @app.post("/start_session")
 def start_session(request: StartSessionRequest):
-    bot_key = assign_bot_config()
-    if not bot_key:
-        raise HTTPException(status_code=429, detail="All bot slots in use")
-
+    pool = get_worker_pool()
     session_id = str(uuid4())
-    start_time = datetime.utcnow().isoformat()
+    sessions = get_session_store()
+    # Registered before queueing so a fast worker always finds the state entry
+    sessions.create(session_id, wallet=request.wallet)
+
+    try:
+        job_id, attached, queue_status = pool.submit_session(request.wallet, session_id)
+    except Exception as e:
+        print(f"Failed to queue session: {e}")
+        sessions.delete(session_id)
+        raise HTTPException(status_code=500, detail="Failed to queue session")
 
-    states = load_session_states()
-    states[session_id] = {"status": "Running", "start_time": start_time, "end_time": None}
-    save_session_states(states)
+    if attached:
+        # Same wallet already queued or running: follow that session instead
+        sessions.delete(session_id)
+        print(f"Attached request for {request.wallet} to session {job_id}")
+        return {"session_id": job_id, "status": "attached", **queue_status}
 
-    config_file = f"config_{bot_key}.json"
-    log_path = LOGS_FOLDER / f"session_{session_id}.log"
+    print(f"Queued session {session_id} on the worker pool")
+    return {"session_id": session_id, "status": "queued", **queue_status}
+
+class StartCohortRequest(BaseModel):
+    wallets: List[str]
+
+@app.post("/start_cohort")
+def start_cohort(request: StartCohortRequest):
+    if not request.wallets:
+        raise HTTPException(status_code=400, detail="No wallets given")
+
+    pool = get_worker_pool()
+    cohort_id = str(uuid4())
+    get_session_store().create(cohort_id, kind="cohort", wallets=len(request.wallets))
 
     try:
-        with open(log_path, "w") as log_file:
-            subprocess.Popen([
-                sys.executable, "api/bot_launcher.py",
-                request.wallet,
-                session_id,
-                config_file,
-                bot_key
-            ], stdout=log_file, stderr=log_file)
-
-        print(f"Launched bot subprocess for session {session_id}, writing to {log_path}")
+        queue_status = pool.submit_cohort(request.wallets, cohort_id)
+        print(f"Queued cohort {cohort_id} on the worker pool")
     except Exception as e:
-        print(f"Failed to launch subprocess: {e}")
-        raise HTTPException(status_code=500, detail="Failed to launch bot process")
+        print(f"Failed to queue cohort: {e}")
+        raise HTTPException(status_code=500, detail="Failed to queue cohort")
 
-    return {"session_id": session_id, "status": "started", "bot": bot_key}
+    return {"cohort_id": cohort_id, "status": "queued", **queue_status}
 
 @app.get("/")
 def root():
     return {"message": "TrenchAssistant API is live."}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition: stored counters/histograms plus live queue, worker and key gauges."""
+    pool = get_worker_pool()
+    running = pool.queue.running_by_worker()
+    # Idle local workers report 0; workers of other processes show up while they hold a job
+    slots = {worker_id: 0 for worker_id in pool.worker_ids}
+    slots.update(running)
+
+    gauges = [
+        ("trench_queue_depth", "Jobs waiting in the queue per kind.",
+            [({"kind": kind}, count) for kind, count in sorted(pool.queue.depth().items())]),
+        ("trench_active_sessions", "Jobs running per worker slot.",
+            [({"slot": slot}, count) for slot, count in sorted(slots.items())]),
+        ("trench_workers", "Worker threads in this API process.", [({}, pool.size)]),
+    ]
+    try:
+        keys_available, uses_remaining = key_quota(pool.config.birdeye_key_file)
+        gauges.append(("trench_api_keys_available", "Birdeye keys with uses left.", [({}, keys_available)]))
+        gauges.append(("trench_api_key_uses_remaining", "Birdeye key uses left across all keys.", [({}, uses_remaining)]))
+    except (OSError, ValueError) as e:
+        print(f"Failed to read API key quota: {e}")
+
+    return PlainTextResponse(get_metrics().render(gauges), media_type="text/plain; version=0.0.4")
+
 @app.get("/get_session_status/{session_id}")
 def get_session_status(session_id: str):
-    states = load_session_states()
-    if session_id not in states:
+    state = get_session_store().get(session_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return states[session_id]
+    if state["status"] in FINISHED_STATUSES:
+        # Superseded by the final result
+        state.pop("interim_result", None)
+    return {**state, **get_worker_pool().status(session_id)}
+
+@app.get("/get_wallet_sessions/{wallet}")
+def get_wallet_sessions(wallet: str, limit: int = Query(20, ge=1, le=100)):
+    return {"wallet": wallet, "sessions": get_session_store().for_wallet(wallet, limit)}
 
 @app.get("/get_session_logs/{session_id}")
-def get_session_logs(session_id: str):
+async def get_session_logs(session_id: str, offset: Optional[int] = Query(None, ge=0)):
+    """
+    The whole log, or with `offset` the complete lines written after that
+    byte (at most one chunk); poll again with the returned next_offset.
+    """
     log_path = os.path.join(LOGS_FOLDER, f"session_{session_id}.log")
     if not os.path.exists(log_path):
         raise HTTPException(status_code=404, detail="Log not found")
-    with open(log_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    return {"logs": lines}
+    if offset is None:
+        lines, next_offset = await asyncio.to_thread(read_full_log, log_path)
+    else:
+        lines, next_offset = await asyncio.to_thread(read_log_chunk, log_path, offset)
+    return {"logs": lines, "next_offset": next_offset}
+
+@app.get("/stream_session_logs/{session_id}")
+async def stream_session_logs(
+    session_id: str,
+    offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-Sent Events tail of a session log until the session finishes."""
+    sessions = get_session_store()
+    state = await asyncio.to_thread(sessions.get, session_id)
+    log_path = os.path.join(LOGS_FOLDER, f"session_{session_id}.log")
+    if state is None and not os.path.exists(log_path):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # EventSource reconnects resume from the last delivered line
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    return StreamingResponse(
+        tail_log_events(log_path, offset, lambda: sessions.is_finished(session_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/get_session_result_by_wallet/{wallet}")
 def get_session_result(wallet: str):
+    result = get_result_store().latest_for_wallet(wallet)
+    if result is not None:
+        return result
+
+    # Results written before the result store existed
     result_path = os.path.join(RESULTS_FOLDER, f"{wallet}.json")
     if not os.path.exists(result_path):
         raise HTTPException(status_code=404, detail="Results not found for this wallet")
     with open(result_path, "r", encoding="utf-8") as f:
         result = json.load(f)
     return result
+
+def parse_time(value: Optional[str], name: str) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@app.get("/results")
+def list_results(
+    wallet: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    min_profit_usd: Optional[float] = None,
+    min_win_rate: Optional[float] = None,
+    include_errors: bool = False,
+    sort: str = "finished_at",
+    order: str = "desc",
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    if sort not in SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+
+    total, results = get_result_store().query(
+        wallet=wallet,
+        since=parse_time(since, "since"),
+        until=parse_time(until, "until"),
+        min_profit_usd=min_profit_usd,
+        min_win_rate=min_win_rate,
+        status=None if include_errors else "ok",
+        sort_by=sort,
+        descending=order == "desc",
+        limit=limit,
+        offset=offset
+    )
+    for result in results:
+        result["finished_at"] = datetime.fromtimestamp(result["finished_at"], timezone.utc).isoformat()
+    return {"total": total, "limit": limit, "offset": offset, "results": results}
+
+@app.get("/results/{session_id}")
+def get_result_by_session(session_id: str):
+    result = get_result_store().get(session_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found for this session")
+    return result
+
+@app.get("/get_cohort_result/{cohort_id}")
+def get_cohort_result(cohort_id: str):
+    result_path = os.path.join(RESULTS_FOLDER, f"cohort_{cohort_id}.json")
+    if not os.path.exists(result_path):
+        raise HTTPException(status_code=404, detail="Results not found for this cohort")
+    with open(result_path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    return result
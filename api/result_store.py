@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+RESULT_DB = "/var/data/results.db"
+SORT_COLUMNS = ("finished_at", "total_profit_usd", "win_rate")
+
+class ResultStore:
+    """
+    Session results keyed by session id. Summary columns (wallet, finish
+    time, PnL, win rate) are indexed for filtering and sorting; the full
+    result dict is kept alongside as a JSON blob and only read when asked for.
+    """
+
+    def __init__(self, db_path: str = RESULT_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    session_id TEXT PRIMARY KEY,
+                    wallet TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    total_profit_usd REAL,
+                    win_rate REAL,
+                    result TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_wallet ON results (wallet, finished_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_finished ON results (finished_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_profit ON results (total_profit_usd)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_win_rate ON results (win_rate)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save(self, session_id: str, wallet: str, result: Dict):
+        """Store a result dict; payloads carrying "errors" are kept with status "error"."""
+        status = "error" if result.get("errors") else "ok"
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO results
+                    (session_id, wallet, finished_at, status, total_profit_usd, win_rate, result)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                session_id, wallet, time.time(), status,
+                result.get("total_profit_usd"), result.get("win_rate"), json.dumps(result)
+            ))
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT result FROM results WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return json.loads(row["result"]) if row is not None else None
+
+    def latest_for_wallet(self, wallet: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT result FROM results WHERE wallet = ? ORDER BY finished_at DESC LIMIT 1", (wallet,)
+        ).fetchone()
+        return json.loads(row["result"]) if row is not None else None
+
+    def query(
+        self,
+        wallet: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        min_profit_usd: Optional[float] = None,
+        min_win_rate: Optional[float] = None,
+        status: Optional[str] = "ok",
+        sort_by: str = "finished_at",
+        descending: bool = True,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[int, List[Dict]]:
+        """Filtered page of result summaries, plus the total number of matches."""
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+
+        filters = {
+            "wallet = ?": wallet,
+            "finished_at >= ?": since,
+            "finished_at < ?": until,
+            "total_profit_usd >= ?": min_profit_usd,
+            "win_rate >= ?": min_win_rate,
+            "status = ?": status
+        }
+        clauses = [clause for clause, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM results {where}", params).fetchone()[0]
+        rows = conn.execute(f"""
+            SELECT session_id, wallet, finished_at, status, total_profit_usd, win_rate
+            FROM results {where}
+            ORDER BY {sort_by} {'DESC' if descending else 'ASC'}, session_id
+            LIMIT ? OFFSET ?
+        """, params + [limit, offset]).fetchall()
+        return total, [dict(row) for row in rows]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_result_store() -> ResultStore:
+    """Return the process-wide result store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
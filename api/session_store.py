@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SESSION_DB = "/var/data/sessions.db"
+# Written by earlier versions; imported once and renamed
+LEGACY_STATE_FILE = "/var/data/session_state.json"
+# Finished sessions older than this move to the archive table
+SESSION_TTL_SECS = 7 * 24 * 3600
+ARCHIVE_EVERY_SECS = 3600
+
+FINISHED_STATUSES = ("Completed", "Failed")
+# status -> statuses it may be entered from; Running -> Running covers a job re-claimed after a lost lease
+TRANSITIONS = {
+    "Running": ("Queued", "Running"),
+    "Completed": ("Queued", "Running"),
+    "Failed": ("Queued", "Running"),
+}
+
+COLUMNS = "session_id, kind, wallet, status, start_time, end_time, extra"
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _format_time(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value is not None else None
+
+class SessionStore:
+    """
+    Session and cohort states in SQLite, looked up by primary key (session
+    id) or the wallet index. Status changes are single conditional UPDATEs,
+    so concurrent writers cannot lose each other's updates and a finished
+    session never goes back to running. Finished sessions past their TTL are
+    moved to an archive table, keeping the live table small.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB, ttl_secs: int = SESSION_TTL_SECS):
+        self.db_path = db_path
+        self.ttl_secs = ttl_secs
+        self._local = threading.local()
+        self._last_archive = 0.0
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        for table in ("sessions", "sessions_archive"):
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    session_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    wallet TEXT,
+                    status TEXT NOT NULL,
+                    start_time REAL NOT NULL,
+                    end_time REAL,
+                    extra TEXT
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_wallet ON {table} (wallet, start_time)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions (end_time)")
+
+        if os.path.exists(LEGACY_STATE_FILE):
+            self.import_json(LEGACY_STATE_FILE)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        state = {
+            "status": row["status"],
+            "start_time": _format_time(row["start_time"]),
+            "end_time": _format_time(row["end_time"]),
+        }
+        if row["wallet"] is not None:
+            state["wallet"] = row["wallet"]
+        return {**state, **json.loads(row["extra"] or "{}")}
+
+    def import_json(self, path: str):
+        """Copy sessions from a session_state.json file, then rename it so it is only read once."""
+        try:
+            with open(path, "r") as f:
+                states = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not import {path}: {e}")
+            return
+
+        rows = []
+        for session_id, state in states.items():
+            extra = {k: v for k, v in state.items() if k not in ("status", "start_time", "end_time")}
+            rows.append((
+                session_id,
+                "cohort" if "wallets" in extra else "session",
+                None,
+                state.get("status", "Queued"),
+                _parse_time(state.get("start_time")) or time.time(),
+                _parse_time(state.get("end_time")),
+                json.dumps(extra) if extra else None
+            ))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(f"INSERT OR IGNORE INTO sessions ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        try:
+            os.replace(path, f"{path}.imported")
+        except OSError:
+            pass  # another process imported it first
+        print(f"Imported {len(rows)} sessions from {path}")
+
+    def create(self, session_id: str, kind: str = "session", wallet: Optional[str] = None, **extra):
+        self._connect().execute(
+            f"INSERT INTO sessions ({COLUMNS}) VALUES (?, ?, ?, 'Queued', ?, NULL, ?)",
+            (session_id, kind, wallet, time.time(), json.dumps(extra) if extra else None)
+        )
+        if time.time() - self._last_archive >= ARCHIVE_EVERY_SECS:
+            self.archive_expired()
+
+    def delete(self, session_id: str):
+        self._connect().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def transition(self, session_id: str, status: str) -> bool:
+        """Move a session to status if its current status allows it; False if it did not."""
+        allowed = TRANSITIONS[status]
+        end_time = time.time() if status in FINISHED_STATUSES else None
+        cursor = self._connect().execute(f"""
+            UPDATE sessions SET status = ?, end_time = ?
+            WHERE session_id = ? AND status IN ({', '.join('?' * len(allowed))})
+        """, (status, end_time, session_id, *allowed))
+        return cursor.rowcount == 1
+
+    def update(self, session_id: str, **extra) -> bool:
+        """Merge fields into a session's extra state; False if there is no such live session."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT extra FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None:
+                merged = {**json.loads(row["extra"] or "{}"), **extra}
+                conn.execute("UPDATE sessions SET extra = ? WHERE session_id = ?", (json.dumps(merged), session_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        for table in ("sessions", "sessions_archive"):
+            row = conn.execute(f"SELECT {COLUMNS} FROM {table} WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None:
+                return self._to_dict(row)
+        return None
+
+    def is_finished(self, session_id: str) -> bool:
+        state = self.get(session_id)
+        return state is None or state["status"] in FINISHED_STATUSES
+
+    def for_wallet(self, wallet: str, limit: int = 20) -> List[Dict]:
+        """Most recent live sessions of a wallet."""
+        rows = self._connect().execute(
+            f"SELECT {COLUMNS} FROM sessions WHERE wallet = ? ORDER BY start_time DESC LIMIT ?",
+            (wallet, limit)
+        ).fetchall()
+        return [{"session_id": row["session_id"], **self._to_dict(row)} for row in rows]
+
+    def archive_expired(self) -> int:
+        """Move sessions that finished more than ttl_secs ago to the archive table."""
+        self._last_archive = time.time()
+        cutoff = self._last_archive - self.ttl_secs
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO sessions_archive ({COLUMNS})
+                SELECT {COLUMNS} FROM sessions WHERE end_time < ?
+            """, (cutoff,))
+            moved = conn.execute("DELETE FROM sessions WHERE end_time < ?", (cutoff,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return moved
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
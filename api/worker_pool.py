@@ -0,0 +1,126 @@
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from core.config import load_config
+from api.bot_launcher import run_session
+from api.cohort_launcher import run_cohort
+from api.job_queue import MAX_ATTEMPTS, JobQueue, get_job_queue
+from api.session_store import get_session_store
+
+# Sessions are I/O bound, so a few threads cover many concurrent wallets
+POOL_SIZE = int(os.environ.get("TRENCH_WORKER_POOL_SIZE", "3"))
+WORKER_CONFIG_FILE = os.environ.get("TRENCH_WORKER_CONFIG", "config_bot1.json")
+# Idle workers re-check the queue this often for jobs from other processes or expired leases
+POLL_SECS = 5
+
+class WorkerPool:
+    """
+    Long-lived worker threads inside the API process that pull session and
+    cohort jobs from the durable JobQueue. Modules are imported once, and the
+    HTTP connection pool, rate limiter and metadata and candle caches are
+    reused by every job; each job takes its own Birdeye key.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        config_path: str = WORKER_CONFIG_FILE,
+        queue: Optional[JobQueue] = None
+    ):
+        self.size = size
+        self.config_path = config_path
+        # Read by /metrics for the Birdeye key file; jobs load their own config
+        self.config = load_config(Path(config_path))
+        self.queue = queue or get_job_queue()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.worker_ids = [f"{socket.gethostname()}-{os.getpid()}-{i}" for i in range(size)]
+        self.workers = [
+            threading.Thread(target=self._work, args=(worker_id,), daemon=True)
+            for worker_id in self.worker_ids
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _heartbeat(self, job_id: str, worker_id: str, done: threading.Event):
+        while not done.wait(self.queue.lease_secs / 3):
+            if not self.queue.heartbeat(job_id, worker_id):
+                print(f"Lost lease on job {job_id}")
+                # A re-queued job gets a new Running state when it is claimed again; a failed one ends here
+                job = self.queue.get(job_id)
+                if job is not None and job["status"] == "failed":
+                    get_session_store().transition(job_id, "Failed")
+                return
+
+    def _run(self, job: Dict) -> bool:
+        payload = job["payload"]
+        if job["kind"] == "cohort":
+            return run_cohort(payload["wallets"], job["job_id"], self.config_path)
+        return run_session(payload["wallet"], job["job_id"], self.config_path)
+
+    def _work(self, worker_id: str):
+        while not self._stopping.is_set():
+            try:
+                job, failed = self.queue.claim(worker_id)
+            except Exception as e:
+                print(f"Worker {worker_id} failed to claim a job: {e}")
+                job, failed = None, []
+            for failed_id in failed:
+                print(f"Job {failed_id} failed after {MAX_ATTEMPTS} lost leases")
+                get_session_store().transition(failed_id, "Failed")
+            if job is None:
+                self._wakeup.wait(POLL_SECS)
+                self._wakeup.clear()
+                continue
+
+            job_id = job["job_id"]
+            get_session_store().transition(job_id, "Running")
+            done = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job_id, worker_id, done), daemon=True).start()
+            status = "failed"
+            try:
+                if self._run(job):
+                    status = "completed"
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+                get_session_store().transition(job_id, "Failed")
+            finally:
+                done.set()
+                self.queue.finish(job_id, worker_id, status)
+
+    def _enqueue(self, job_id: str, kind: str, payload: Dict) -> Dict:
+        self.queue.enqueue(job_id, kind, payload)
+        self._wakeup.set()
+        return self.queue.queue_status(job_id, self.size)
+
+    def submit_session(self, wallet: str, session_id: str) -> Tuple[str, bool, Dict]:
+        """Queue a session, or attach to the wallet's queued/running one (single-flight)."""
+        job_id, attached = self.queue.enqueue_or_attach(session_id, wallet, {"wallet": wallet})
+        if not attached:
+            self._wakeup.set()
+        return job_id, attached, self.queue.queue_status(job_id, self.size)
+
+    def submit_cohort(self, wallets: List[str], cohort_id: str) -> Dict:
+        return self._enqueue(cohort_id, "cohort", {"wallets": wallets})
+
+    def status(self, job_id: str) -> Dict:
+        return self.queue.queue_status(job_id, self.size)
+
+    def shutdown(self):
+        # Running jobs are not interrupted; if the process exits their leases expire and they are re-queued
+        self._stopping.set()
+        self._wakeup.set()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool() -> WorkerPool:
+    """Return the process-wide worker pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
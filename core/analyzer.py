@@ -2,11 +2,13 @@ from typing import List, Dict, Optional
 from collections import defaultdict
 from datetime import datetime
 from .models import Transaction, TokenTradeAggregate
+from .lot_matcher import LotMatcher
 import math
 
 class TradeAnalyzer:
-    def __init__(self, transactions: List[Transaction]):
+    def __init__(self, transactions: List[Transaction], lot_method: str = "fifo"):
         self.transactions = sorted(transactions, key=lambda tx: tx.timestamp)
+        self.lot_method = lot_method
         self.aggregated_trades: List[TokenTradeAggregate] = []
 
     def aggregate_trades(self):
@@ -144,5 +146,6 @@ class TradeAnalyzer:
             "worst_token_by_profit": worst_token,
             "start_date": start_date,
             "end_date": end_date,
-            "aggregated_trades": self.aggregated_trades
+            "aggregated_trades": self.aggregated_trades,
+            "round_trips": LotMatcher(self.lot_method).match(self.transactions)
         }
@@ -1,8 +1,19 @@
 import json
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 from filelock import FileLock
 
+MAX_USES_PER_KEY = 10
+
+def key_quota(key_file: str) -> Tuple[int, int]:
+    """Keys that can still be handed out and the uses left across all of them."""
+    key_file = Path(key_file)
+    with FileLock(key_file.with_suffix(".lock")):
+        with open(key_file, "r") as f:
+            keys = json.load(f)
+    remaining = [max(0, MAX_USES_PER_KEY - entry.get("used", 0)) for entry in keys]
+    return sum(1 for uses in remaining if uses), sum(remaining)
+
 class APIKeyManager:
     def __init__(self, key_file: str):
         self.key_file = Path(key_file)
@@ -24,7 +35,7 @@ class APIKeyManager:
         with FileLock(self.lock_file):
             self.keys = self._load_keys()
             for key_entry in self.keys:
-                if key_entry.get("used", 0) < 10:
+                if key_entry.get("used", 0) < MAX_USES_PER_KEY:
                     key_entry["used"] = key_entry.get("used", 0) + 1
                     self._save_keys()
                     return key_entry["key"]
@@ -32,3 +43,14 @@ class APIKeyManager:
 
     def get_key(self) -> str:
         return self.active_key
+
+    def rotate(self) -> str:
+        """Retire the active key (rejected or out of quota upstream) and take the next one."""
+        with FileLock(self.lock_file):
+            self.keys = self._load_keys()
+            for key_entry in self.keys:
+                if key_entry["key"] == self.active_key:
+                    key_entry["used"] = MAX_USES_PER_KEY
+            self._save_keys()
+        self.active_key = self._get_next_key()
+        return self.active_key
@@ -1,21 +1,32 @@
-from datetime import datetime, timedelta, timezone
-import time
-import sqlite3
+from datetime import datetime, timezone
+import asyncio
+import math
+import os
+import threading
 import uuid
-from typing import Optional, List, Tuple, Dict
+
+import requests
+from typing import Callable, Optional, List, Tuple, Dict
 
 from .config import load_config
 from .transaction_fetcher import SolanaFMRawFetcher
 from .market_data import BirdeyeMarketDataProvider
-from .storage import init_db, insert_raw_transfer, load_last_page, save_last_page, delete_db
+from .storage import TransferStore, delete_db
 from .enricher import DatabaseEnricher, PriceEnricher
 from .analyzer import TradeAnalyzer
-from .models import Transaction, SessionResult
+from .columnar_analyzer import ColumnarTradeAnalyzer
+from .streaming_analyzer import StreamingTradeAnalyzer
+from .lot_matcher import LotMatcher
+from .models import Transaction, TransactionBatch, SessionResult
 from .utils import clean_transfer_database
-from .session_utils import load_used_addresses, save_used_address, kill_session_after
-from .api_key_manager import APIKeyManager
+from .session_utils import load_used_addresses, save_used_address
+from .deadline import Deadline, DeadlineExceeded
+from .profiler import Profile, profiling, span
 from .session_logger import SessionLogger
 
+# Share of the session budget kept back from pricing so analysis and result writing still run
+ANALYSIS_RESERVE_SECS = 15
+
 class MemeBot:
     def __init__(
         self,
@@ -24,147 +35,352 @@ class MemeBot:
         birdeye_key_file: str,
         config_path: str = "config.json",
         session_id: Optional[str] = None,
-        max_valid_transfers: int = 50
+        max_valid_transfers: Optional[int] = None,
+        price_provider: Optional[BirdeyeMarketDataProvider] = None,
+        check_used_wallet: bool = True,
+        timeout_secs: Optional[int] = 600,
+        on_interim: Optional[Callable[[SessionResult], None]] = None
     ):
         self.config = load_config(config_path)
         self.wallet = wallet_address
         self.session_id = session_id or str(uuid.uuid4())
-        self.db_path = f"{self.config.db_base_path}tmp_session_{self.session_id}.db"
-        self.logger = SessionLogger(self.session_id)
-        self.max_valid_transfers = max_valid_transfers
+        self.incremental = self.config.incremental_sync
+        if self.incremental:
+            # One persistent store per wallet, merged on every re-sync
+            self.db_path = f"{self.config.db_base_path}wallet_{self.wallet}.db"
+        else:
+            self.db_path = f"{self.config.db_base_path}tmp_session_{self.session_id}.db"
+        self.logger = SessionLogger(self.session_id, json_lines=self.config.json_logs)
+        self.max_valid_transfers = max_valid_transfers or self.config.max_valid_transfers
+        self.store: Optional[TransferStore] = None
+        # Given a partial result each time a batch of prices is written
+        self.on_interim = on_interim
+        self.streaming_analyzer: Optional[StreamingTradeAnalyzer] = None
+        self._interim_lock = threading.Lock()
+        self.start_time: Optional[datetime] = None
+        self.pending_sync_state: Optional[Tuple[str, Optional[int]]] = None
+        self.profile: Optional[Profile] = None
+        # Cohort runs analyze wallets regardless of earlier sessions
+        self.check_used_wallet = check_used_wallet and not self.incremental
+        # Every stage checks this budget and winds down on its own when it runs out
+        self.deadline = Deadline(timeout_secs)
 
         # Load and rotate API keys
         self.solanafm_key = self.config.solanafm_api_key
-        self.birdeye_key = APIKeyManager(birdeye_key_file).get_key()
 
         # Initialize providers
         self.fetcher = SolanaFMRawFetcher(
             api_key=self.solanafm_key,
             logger=self.logger,
+            max_concurrency=self.config.fetch_concurrency,
         )
-        self.price_provider = BirdeyeMarketDataProvider(
-            api_key=self.birdeye_key,
-            logger=self.logger
+        if price_provider is None:
+            # A shared provider (e.g. from a cohort) already holds its own key
+            price_provider = BirdeyeMarketDataProvider.from_key_file(birdeye_key_file, logger=self.logger)
+        self.price_provider = price_provider
+
+    async def _fetch_pages(
+        self,
+        queue: asyncio.Queue,
+        page: int,
+        until_signature: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        next_page: Optional[asyncio.Semaphore] = None
+    ):
+        """
+        Producer: fetch pages until the last one, each only once the consumer
+        releases next_page for it, so it never runs more than one page ahead.
+        """
+        while True:
+            if deadline is not None and deadline.expired():
+                return
+            self.logger.log(f"Fetching page {page}...")
+            try:
+                with span("fetch_page"):
+                    transfers, signatures = await self.fetcher.fetch_transfers_async(
+                        self.wallet, page=page, until_signature=until_signature, deadline=deadline
+                    )
+            except DeadlineExceeded:
+                self.logger.log(f"Deadline reached while fetching page {page}.", level="WARNING")
+                await queue.put((page, None, [], "deadline"))
+                return
+            except (requests.RequestException, ValueError) as e:
+                # HTTP failures and unreadable responses; anything else is a bug and propagates
+                self.logger.log(f"Error during fetch: {e}", level="ERROR")
+                await queue.put((page, None, [], "error"))
+                return
+
+            await queue.put((page, transfers, signatures, None))
+            # A short page is either the end of history or the previous high-water mark
+            if len(signatures) < self.fetcher.limit:
+                return
+            if next_page is not None:
+                await next_page.acquire()
+            page += 1
+
+    def _store_page(self, page: int, transfers: List[Dict], signatures: List[str]) -> int:
+        """Consumer step: insert a page, enrich metadata and return the valid transfer count."""
+        with span("store_page"):
+            self.store.insert_transfers(transfers)
+
+        self.store.save_last_page(page + 1)
+        if self.incremental:
+            if page == 1 and signatures and self.pending_sync_state is None:
+                newest_ts = max((tx["timestamp"] for tx in transfers), default=None)
+                self.pending_sync_state = (signatures[0], newest_ts)
+            if self.pending_sync_state:
+                # The mark only moves once the old one is reached; until then a re-sync resumes here
+                self.store.save_sync_cursor(page + 1, *self.pending_sync_state)
+        self.logger.log(f"Page {page} stored. Starting enrichment.")
+
+        # Encrich symbols and decimals
+        with span("metadata_enrich"):
+            enricher = DatabaseEnricher(self.store, deadline=self.deadline)
+            enricher.run()
+
+        # Count valid enriched BUYS/SELLs
+        valid_count = self.store.count_valid_transfers()
+        self.logger.log(f"[✔️] {valid_count} valid enriched transfers collected so far.")
+        return valid_count
+
+    async def _collect_transfers(self, deadline: Deadline) -> Tuple[int, str]:
+        """
+        Fetch page N+1 while page N is being stored and enriched, unless page
+        N alone may already reach the cap. Stops once enough new valid
+        transfers are collected or time runs out, cancelling any fetch still
+        in flight. Returns the new valid transfers and why fetching stopped:
+        "cap", "end" (end of history or the previous high-water mark),
+        "deadline" or "error". Only the first two mean the stage is complete.
+        """
+        cap = self.max_valid_transfers
+        if self.incremental:
+            # Re-syncs start from the newest page, or where an unfinished one stopped, and run to the high-water mark
+            until_signature, _ = self.store.load_sync_state()
+            cursor = self.store.load_sync_cursor()
+            if cursor:
+                first_page, *pending = cursor
+                self.pending_sync_state = tuple(pending)
+                self.logger.log(f"Resuming unfinished re-sync from page {first_page}.")
+            else:
+                first_page = 1
+            # Stopping early would leave a gap below the mark, so re-syncs are not capped
+            cap = math.inf
+        else:
+            first_page = self.store.load_last_page()
+            until_signature = None
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        next_page = asyncio.Semaphore(0)
+        producer = asyncio.create_task(self._fetch_pages(queue, first_page, until_signature, deadline, next_page))
+        baseline = self.store.count_valid_transfers() if self.incremental else 0
+        valid_count = baseline
+        stop_reason = "cap"
+
+        try:
+            while valid_count - baseline < cap:
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    stop_reason = "deadline"
+                    break
+                # Waiting on the producer too, so a fetcher that dies without queueing a page cannot stall the run
+                next_item = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({next_item, producer}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if next_item in done:
+                    item = next_item.result()
+                else:
+                    next_item.cancel()
+                    if producer not in done:
+                        self.logger.log("Run time exceeded while waiting for the next page.")
+                        stop_reason = "deadline"
+                        break
+                    if queue.empty():
+                        stop_reason = "error" if producer.exception() is not None else "deadline"
+                        break
+                    item = queue.get_nowait()
+                page, transfers, signatures, failure = item
+
+                if failure:
+                    stop_reason = failure
+                    break
+
+                last_page = len(signatures) < self.fetcher.limit
+                # Every parsed transfer is a BUY/SELL candidate, so this bounds what the page can add
+                prefetch = not last_page and valid_count - baseline + len(transfers) < cap
+                if prefetch:
+                    next_page.release()
+
+                valid_count = await asyncio.to_thread(self._store_page, page, transfers, signatures)
+                if last_page:
+                    self.logger.log("Reached the end of new transactions — stopping.")
+                    stop_reason = "end"
+                    break
+                if not prefetch and valid_count - baseline < cap:
+                    next_page.release()
+        finally:
+            producer.cancel()
+            await asyncio.wait({producer})
+            if not producer.cancelled() and producer.exception() is not None:
+                # Logged rather than raised: the transfers stored so far are still analyzed
+                error = producer.exception()
+                self.logger.log(f"Fetcher failed unexpectedly: {error!r}", level="ERROR")
+
+        return valid_count - baseline, stop_reason
+
+    def _to_transaction(self, row: tuple) -> Transaction:
+        return Transaction(
+            signature=str(row[0]),
+            timestamp=datetime.fromtimestamp(row[1], timezone.utc),
+            token_address=row[2],
+            token_symbol=row[3],
+            amount=row[4],
+            amount_usd=row[5],
+            market_cap_usd=row[6],
+            type=row[7],
+            source=row[8]
         )
 
-    def run(self) -> SessionResult:
-        self.logger.log(f"Starting TrenchAssitant session {self.session_id} for wallet {self.wallet}")
+    def _analyze(self) -> Dict:
+        engine = self.config.analysis_engine
+        lot_method = self.config.lot_matching
+        if engine == "streaming":
+            analyzer = StreamingTradeAnalyzer(lot_method=lot_method)
+            for batch in self.store.iter_trade_rows():
+                if self.deadline.expired():
+                    self.logger.log("Deadline reached during analysis; returning the partial result.", level="WARNING")
+                    break
+                analyzer.add_batch(self._to_transaction(row) for row in batch)
+            return analyzer.analyze()
 
-        # Prevent reuse of wallet
-        if self.wallet in load_used_addresses():
-            self.logger.log(f"Wallet {self.wallet} has already been analyzed.")
+        if engine == "columnar":
+            batch = TransactionBatch.from_cursor(self.store.trade_rows_cursor())
+            analysis = ColumnarTradeAnalyzer.from_batch(batch).analyze()
+            # Lot matching is sequential; it walks the batch's per-token columns after the vectorized pass
+            analysis["round_trips"] = LotMatcher(lot_method).match_batch(batch)
+            return analysis
+
+        rows = self.store.load_trade_rows()
+        return TradeAnalyzer([self._to_transaction(row) for row in rows], lot_method=lot_method).analyze()
+
+    def interim_result(self) -> Optional[SessionResult]:
+        """Partial result over the transfers priced so far, while pricing runs."""
+        if self.streaming_analyzer is None:
             return None
-        save_used_address(self.wallet)
+        with self._interim_lock:
+            return self.streaming_analyzer.snapshot(
+                self.session_id, self.wallet, self.start_time.strftime("%Y-%m-%d %H:%M:%S")
+            )
 
-        # Kill session if it exceeds max runtime
-        kill_session_after(600)  # 10 minutes
+    def _start_interim(self):
+        """Seed the interim analysis with transfers priced by an earlier run or attempt."""
+        self.streaming_analyzer = StreamingTradeAnalyzer(lot_method=self.config.lot_matching)
+        rows = self.store.load_priced_trade_rows()
+        self.streaming_analyzer.add_batch(self._to_transaction(row) for row in rows)
 
-        init_db(self.db_path)
-        start_time = datetime.now(timezone.utc)
-        end_time = start_time + timedelta(minutes=self.config.run_minutes)
+    def _feed_interim(self, rowids: List[int]):
+        """PriceEnricher hook: fold a freshly priced batch into the interim analysis and publish it."""
+        rows = self.store.load_trade_rows_by_id(rowids)
+        with self._interim_lock:
+            self.streaming_analyzer.add_batch(self._to_transaction(row) for row in rows)
+        self.on_interim(self.interim_result())
 
-        valid_count = 0
-        page = load_last_page(self.db_path)
+    def run(self) -> SessionResult:
+        """Run the session, timing its stages when profiling is enabled."""
+        self.profile = Profile() if self.config.profile_sessions else None
+        with profiling(self.profile):
+            return self._run()
 
-        while datetime.now(timezone.utc) < end_time and valid_count < self.max_valid_transfers:
-            try:
-                self.logger.log(f"Fetching page {page}...")
-                transfers, _ = self.fetcher.fetch_transfers(self.wallet, page=page)
-            except Exception as e:
-                self.logger.log(f"Error during fetch: {e}", level="ERROR")
-                break
+    def _run(self) -> SessionResult:
+        self.logger.log(f"Starting TrenchAssitant session {self.session_id} for wallet {self.wallet}")
 
-            if not transfers:
-                self.logger.log("No transfers returned — stopping.")
-                break
+        # A retried session finds its own database and checkpoints from the interrupted attempt
+        resuming = not self.incremental and os.path.exists(self.db_path)
 
-            for tx in transfers:
-                insert_raw_transfer(tx, self.db_path)
+        if self.check_used_wallet and not resuming:
+            # Prevent reuse of wallet
+            if self.wallet in load_used_addresses():
+                self.logger.log(f"Wallet {self.wallet} has already been analyzed.")
+                return None
+            save_used_address(self.wallet)
 
-            save_last_page(self.db_path, page + 1)
-            page += 1
-            self.logger.log(f"Page {page-1} stored. Starting enrichment.")
-            time.sleep(self.config.refresh_interval)
+        self.store = TransferStore(self.db_path)
+        stages = self.store.completed_stages(self.session_id)
+        if stages:
+            self.logger.log(f"Resuming session {self.session_id}; completed stages: {', '.join(sorted(stages))}")
+        if self.incremental:
+            _, last_timestamp = self.store.load_sync_state()
+            if last_timestamp:
+                self.logger.log(f"Re-syncing wallet {self.wallet} from its last seen transfer at {last_timestamp}.")
 
-            # Encrich symbols and decimals
-            enricher = DatabaseEnricher(self.db_path)
-            enricher.run()
+        start_time = self.start_time = datetime.now(timezone.utc)
+
+        # Later stages are only checkpointed over a complete fetch, since a retry adds more rows
+        fetched = "fetched" in stages
+        if not fetched:
+            if resuming:
+                self.logger.log(f"Resuming fetch from page {self.store.load_last_page()}.")
+            with span("fetch"):
+                new_count, stop_reason = asyncio.run(
+                    self._collect_transfers(self.deadline.child(self.config.run_minutes * 60))
+                )
+            if self.incremental:
+                if stop_reason == "end" and self.pending_sync_state:
+                    self.store.finish_sync(*self.pending_sync_state)
+                elif stop_reason != "end":
+                    self.logger.log("Re-sync stopped before the last synced transfer; the next run resumes it.", level="WARNING")
+                self.logger.log(f"{new_count} new valid transfers merged into the wallet store.")
+            # A fetch cut short by the deadline or an error is resumed by the next retry
+            fetched = stop_reason in ("cap", "end")
+            if fetched:
+                self.store.mark_stage_done(self.session_id, "fetched")
 
-            # Count valid enriched BUYS/SELLs
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM raw_transfers
-                WHERE action IN ('BUY', 'SELL')
-                AND decimals IS NOT NULL AND decimals > 0
-                AND token_symbol IS NOT NULL
-                AND token_symbol NOT LIKE 'UNKNOWN_%'
-                AND token_symbol != ''
-                AND token IS NOT NULL
-            """)
-            valid_count = cursor.fetchone()[0]
-            conn.close()
-
-            self.logger.log(f"[✔️] {valid_count} valid enriched transfers collected so far.")
-            time.sleep(self.config.refresh_interval)
-
-        # Enrich metadata
-        self.logger.log("\nStarting database enrichment (symbols, decimals)...")
-        enricher = DatabaseEnricher(self.db_path)
-        enricher.run()
-        self.logger.log("\nSymbol and decimals enrichment completed!")
-
-        clean_transfer_database(self.db_path)
-
-        # Enrich historical prices
-        self.logger.log("\nStarting historical price enrichment...")
-        price_enricher = PriceEnricher(self.db_path, self.price_provider)
-        price_enricher.run()
-        self.logger.log("\nHistorical price enrichment completed!")
+        if "enriched" not in stages:
+            # Enrich metadata
+            self.logger.log("\nStarting database enrichment (symbols, decimals)...")
+            with span("metadata_enrich"):
+                enricher = DatabaseEnricher(self.store, deadline=self.deadline)
+                enricher.run()
+            self.logger.log("\nSymbol and decimals enrichment completed!")
+            if fetched and not self.deadline.expired():
+                self.store.mark_stage_done(self.session_id, "enriched")
+
+        if "cleaned" not in stages:
+            # Merged wallet stores keep every valid transfer
+            with span("clean"):
+                clean_transfer_database(self.db_path, limit=None if self.incremental else self.max_valid_transfers)
+            if fetched:
+                self.store.mark_stage_done(self.session_id, "cleaned")
+
+        if "priced" not in stages:
+            # Enrich historical prices; written in chunks, so a retry only prices what is left
+            self.logger.log("\nStarting historical price enrichment...")
+            if self.on_interim is not None:
+                self._start_interim()
+            price_enricher = PriceEnricher(
+                self.store,
+                self.price_provider,
+                max_in_flight=self.config.price_concurrency,
+                logger=self.logger,
+                deadline=self.deadline.child(self.deadline.remaining() - ANALYSIS_RESERVE_SECS),
+                on_flush=self._feed_interim if self.on_interim is not None else None
+            )
+            with span("price_enrich"):
+                price_enricher.run()
+            self.logger.log("\nHistorical price enrichment completed!")
+            # A run cut short by the deadline is finished by the next retry
+            if fetched and not price_enricher.skipped_ranges:
+                self.store.mark_stage_done(self.session_id, "priced")
 
         # Load and analyze
         self.logger.log("\nRunning analysis...")
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                rowid,
-                timestamp,
-                token,
-                token_symbol,
-                amount,
-                amount_usd,
-                market_cap_usd,
-                action,
-                NULL
-            FROM raw_transfers
-            WHERE action IN ('BUY', 'SELL')
-            ORDER BY timestamp ASC
-        """)
-        rows = cursor.fetchall()
-        conn.close()
-
-        transactions = []
-        for row in rows:
-            transactions.append(Transaction(
-                signature=str(row[0]),
-                timestamp=datetime.fromtimestamp(row[1], timezone.utc),
-                token_address=row[2],
-                token_symbol=row[3],
-                amount=row[4],
-                amount_usd=row[5],
-                market_cap_usd=row[6],
-                type=row[7],
-                source=row[8]
-            ))
-
-        if not transactions:
+        if not self.store.count_trade_rows():
             self.logger.log("No transactions available for analysis.", level="WARNING")
-            delete_db(self.db_path)
+            self.store.close()
+            if not self.incremental:
+                delete_db(self.db_path)
             raise RuntimeError("Session ended with no transactions to analyze.")
 
-        analyzer = TradeAnalyzer(transactions)
-        analysis = analyzer.analyze()
+        with span("analyze"):
+            analysis = self._analyze()
 
         session_result = SessionResult(
             session_id=self.session_id,
@@ -182,12 +398,16 @@ class MemeBot:
             worst_token_by_profit=analysis["worst_token_by_profit"],
             start_date=analysis["start_date"],
             end_date=analysis["end_date"],
-            aggregated_trades=analysis["aggregated_trades"]
+            aggregated_trades=analysis["aggregated_trades"],
+            round_trips=analysis["round_trips"],
+            profile=self.profile.to_dict() if self.profile else None
         )
 
         # Final cleanup
-        delete_db(self.db_path)
-        self.logger.log("Temporary database deleted.")
+        self.store.close()
+        if not self.incremental:
+            delete_db(self.db_path)
+            self.logger.log("Temporary database deleted.")
 
         self.logger.log(f"\nSession {self.session_id} finished successfully!")
         return session_result
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from .models import MarketData
+from .profiler import trace_sql
+
+PRICE_CANDLE_DB = "/var/data/price_candles.db"
+# Minutes this recent may still get a candle, so a gap there is not final
+SETTLE_MINUTES = 5
+
+class CandleStore:
+    """
+    Persistent 1m price candles keyed by (token, minute), shared across
+    sessions, wallets and bot processes. Every minute of a fetched range is
+    recorded, with a NULL price when Birdeye had no candle, so later lookups
+    can tell "no data" apart from "never fetched".
+    """
+
+    def __init__(self, db_path: str = PRICE_CANDLE_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS candles (
+                    token TEXT,
+                    minute INTEGER,
+                    price_usd REAL,
+                    PRIMARY KEY (token, minute)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = trace_sql(sqlite3.connect(self.db_path, timeout=30))
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def missing_ranges(self, token: str, minute_from: int, minute_to: int) -> List[Tuple[int, int]]:
+        """Inclusive minute ranges inside [minute_from, minute_to] that were never fetched."""
+        cursor = self._connect().execute(
+            "SELECT minute FROM candles WHERE token = ? AND minute BETWEEN ? AND ? ORDER BY minute",
+            (token, minute_from, minute_to)
+        )
+        missing = []
+        expected = minute_from
+        for (minute,) in cursor:
+            if minute > expected:
+                missing.append((expected, minute - 1))
+            expected = minute + 1
+        if expected <= minute_to:
+            missing.append((expected, minute_to))
+        return missing
+
+    def store(self, token: str, minute_from: int, minute_to: int, candles: List[MarketData]):
+        """Record a fetched range; minutes without a candle are stored as NULL once settled."""
+        prices = {int(c.timestamp.timestamp()) // 60: c.price_usd for c in candles}
+        settled_before = int(time.time()) // 60 - SETTLE_MINUTES
+        rows = [
+            (token, minute, prices.get(minute))
+            for minute in range(minute_from, minute_to + 1)
+            if minute in prices or minute < settled_before
+        ]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO candles (token, minute, price_usd) VALUES (?, ?, ?)",
+                rows
+            )
+
+    def get_prices(self, token: str, minute_from: int, minute_to: int) -> List[Tuple[int, float]]:
+        """(unix time, price) for every known candle in the range, oldest first."""
+        cursor = self._connect().execute("""
+            SELECT minute, price_usd FROM candles
+            WHERE token = ? AND minute BETWEEN ? AND ? AND price_usd IS NOT NULL
+            ORDER BY minute
+        """, (token, minute_from, minute_to))
+        return [(minute * 60, price) for minute, price in cursor.fetchall()]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_candle_store() -> CandleStore:
+    """Return the process-wide candle store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CandleStore()
+        return _store
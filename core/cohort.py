@@ -0,0 +1,135 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .analyzer import TradeAnalyzer
+from .bot import MemeBot
+from .config import load_config
+from .market_data import BirdeyeMarketDataProvider
+from .models import SessionResult
+from .session_logger import SessionLogger
+
+def build_leaderboard(results: List[SessionResult]) -> List[Dict]:
+    """
+    Rank wallets by total PnL (then win rate), computed in one pass over the
+    concatenated per-token aggregates of every wallet.
+    """
+    if not results:
+        return []
+
+    wallet_ids, profits, durations = [], [], []
+    for i, result in enumerate(results):
+        for trade in result.aggregated_trades or []:
+            wallet_ids.append(i)
+            profits.append(trade.profit_usd)
+            durations.append(trade.duration_secs)
+
+    n = len(results)
+    wallet_ids = np.asarray(wallet_ids, dtype=np.int64)
+    profits = np.asarray(profits, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+
+    trades = np.bincount(wallet_ids, minlength=n)
+    total_profit = np.bincount(wallet_ids, weights=profits, minlength=n)
+    wins = np.bincount(wallet_ids[profits > 0], minlength=n)
+    win_rate = np.divide(wins, trades, out=np.zeros(n), where=trades > 0)
+
+    # Median hold: sort durations within each wallet, then read the middle of every group
+    median_hold = np.zeros(n)
+    if len(durations):
+        sorted_durations = durations[np.lexsort((durations, wallet_ids))]
+        starts = np.cumsum(trades) - trades
+        has_trades = trades > 0
+        low = (starts + (trades - 1) // 2)[has_trades]
+        high = (starts + trades // 2)[has_trades]
+        median_hold[has_trades] = (sorted_durations[low] + sorted_durations[high]) / 2
+
+    ranking = np.lexsort((-win_rate, -total_profit))
+    human_time = TradeAnalyzer([]).calculate_human_readable_time
+    return [
+        {
+            "rank": rank + 1,
+            "wallet_address": results[i].wallet_address,
+            "session_id": results[i].session_id,
+            "total_profit_usd": round(float(total_profit[i]), 4),
+            "win_rate": round(float(win_rate[i]), 4),
+            "median_hold_secs": float(median_hold[i]),
+            "median_hold_time_human": human_time(median_hold[i]),
+            "traded_tokens": int(trades[i])
+        }
+        for rank, i in enumerate(ranking)
+    ]
+
+class CohortRunner:
+    """
+    Analyzes a list of wallets in one process. All sessions share one Birdeye
+    provider and key, the HTTP pool and rate limiter, and the on-disk token
+    metadata cache and candle store, so a token or price range fetched for
+    one wallet is free for the rest.
+    """
+
+    def __init__(
+        self,
+        wallets: List[str],
+        solanafm_key: str,
+        birdeye_key_file: str,
+        config_path: str = "config.json",
+        cohort_id: Optional[str] = None,
+        max_parallel: Optional[int] = None,
+        price_provider: Optional[BirdeyeMarketDataProvider] = None
+    ):
+        self.config = load_config(config_path)
+        self.wallets = list(dict.fromkeys(wallets))
+        self.solanafm_key = solanafm_key
+        self.birdeye_key_file = birdeye_key_file
+        self.config_path = config_path
+        self.cohort_id = cohort_id or str(uuid.uuid4())
+        self.max_parallel = max_parallel or self.config.cohort_concurrency
+        self.logger = SessionLogger(self.cohort_id, json_lines=self.config.json_logs)
+        self.price_provider = price_provider or BirdeyeMarketDataProvider.from_key_file(
+            birdeye_key_file, logger=self.logger
+        )
+        self.results: Dict[str, SessionResult] = {}
+        self.errors: Dict[str, str] = {}
+
+    def _run_wallet(self, wallet: str) -> Tuple[str, Optional[SessionResult], Optional[str]]:
+        try:
+            bot = MemeBot(
+                wallet_address=wallet,
+                solanafm_key=self.solanafm_key,
+                birdeye_key_file=self.birdeye_key_file,
+                config_path=self.config_path,
+                price_provider=self.price_provider,
+                check_used_wallet=False
+            )
+            return wallet, bot.run(), None
+        except Exception as e:
+            return wallet, None, str(e)
+
+    def run(self) -> Dict:
+        started = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.logger.log(f"Starting cohort {self.cohort_id} with {len(self.wallets)} wallets")
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            for wallet, result, error in pool.map(self._run_wallet, self.wallets):
+                if result is not None:
+                    self.results[wallet] = result
+                    self.logger.log(f"Wallet {wallet} analyzed ({len(self.results)}/{len(self.wallets)})")
+                else:
+                    self.errors[wallet] = error or "No result"
+                    self.logger.log(f"Wallet {wallet} failed: {self.errors[wallet]}", level="WARNING")
+
+        leaderboard = build_leaderboard(list(self.results.values()))
+        self.logger.log(f"Cohort {self.cohort_id} finished: {len(self.results)} ranked, {len(self.errors)} failed")
+        self.logger.flush()
+        return {
+            "cohort_id": self.cohort_id,
+            "timestamp_started": started,
+            "timestamp_ended": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            "wallets": self.wallets,
+            "leaderboard": leaderboard,
+            "errors": self.errors
+        }
@@ -0,0 +1,208 @@
+from typing import List, Dict, Optional, Sequence
+from datetime import datetime, timezone
+import numpy as np
+
+from .analyzer import TradeAnalyzer
+from .models import TokenTradeAggregate, TransactionBatch
+
+class ColumnarTradeAnalyzer(TradeAnalyzer):
+    """
+    Drop-in replacement for TradeAnalyzer that works on column arrays instead
+    of Transaction objects. Grouping by token, sums, hold times and the
+    correlation are NumPy operations, so cost grows with the number of tokens
+    rather than with Python work per transfer. analyze() returns the same dict.
+    """
+
+    def __init__(
+        self,
+        timestamps: Sequence[float],
+        token_ids: Sequence[int],
+        token_names: Sequence[str],
+        symbols: Sequence[Optional[str]],
+        amount_usd: Sequence[float],
+        market_caps: Sequence[float],
+        action_codes: Sequence[int]
+    ):
+        """
+        Columns are parallel arrays: token_ids index into token_names, missing
+        USD values / market caps are NaN, and action codes follow
+        TransactionBatch.ACTIONS.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+
+        self.timestamps = timestamps[order]
+        self.token_ids = np.asarray(token_ids, dtype=np.int64)[order]
+        self.token_names = list(token_names)
+        self.symbols = np.asarray(symbols, dtype=object)[order]
+        self.amount_usd = np.asarray(amount_usd, dtype=np.float64)[order]
+        self.market_caps = np.asarray(market_caps, dtype=np.float64)[order]
+        self.action_codes = np.asarray(action_codes, dtype=np.int8)[order]
+        self.aggregated_trades: List[TokenTradeAggregate] = []
+
+    @classmethod
+    def from_batch(cls, batch: TransactionBatch) -> "ColumnarTradeAnalyzer":
+        """Wrap a TransactionBatch's columns without copying them into Python objects."""
+        def column(values):
+            return np.frombuffer(values, dtype=values.typecode) if len(values) else np.empty(0)
+
+        symbol_table = np.array(batch.symbols + [None], dtype=object)
+        return cls(
+            column(batch.timestamps),
+            column(batch.token_ids),
+            batch.tokens,
+            symbol_table[column(batch.symbol_ids).astype(np.int64)],  # -1 -> None
+            column(batch.amount_usd),
+            column(batch.market_caps),
+            column(batch.actions)
+        )
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple]) -> "ColumnarTradeAnalyzer":
+        """Build from rows shaped like TransferStore.load_trade_rows()."""
+        batch = TransactionBatch()
+        for row in rows:
+            batch.append_row(row)
+        return cls.from_batch(batch)
+
+    def _first_rows(self, mask: np.ndarray, token_ids: np.ndarray, n_tokens: int) -> np.ndarray:
+        """Row index of the first masked transfer per token (-1 if none)."""
+        first = np.full(n_tokens, -1, dtype=np.int64)
+        rows = np.flatnonzero(mask)
+        ids, pos = np.unique(token_ids[rows], return_index=True)
+        first[ids] = rows[pos]
+        return first
+
+    def aggregate_trades(self):
+        """Aggregate all buys and sells per token into a single trade entry."""
+        if len(self.token_ids) == 0:
+            return
+
+        unique_tokens, first_seen, token_ids = np.unique(self.token_ids, return_index=True, return_inverse=True)
+        n_tokens = len(unique_tokens)
+
+        is_buy = self.action_codes == TransactionBatch.ACTIONS.index("BUY")
+        is_sell = self.action_codes == TransactionBatch.ACTIONS.index("SELL")
+        usd = np.nan_to_num(self.amount_usd)
+
+        buy_usd = np.bincount(token_ids, weights=np.where(is_buy, usd, 0.0), minlength=n_tokens)
+        sell_usd = np.bincount(token_ids, weights=np.where(is_sell, usd, 0.0), minlength=n_tokens)
+        n_buys = np.bincount(token_ids[is_buy], minlength=n_tokens)
+        n_sells = np.bincount(token_ids[is_sell], minlength=n_tokens)
+
+        first_buy_ts = np.full(n_tokens, np.inf)
+        np.minimum.at(first_buy_ts, token_ids[is_buy], self.timestamps[is_buy])
+        last_sell_ts = np.full(n_tokens, -np.inf)
+        np.maximum.at(last_sell_ts, token_ids[is_sell], self.timestamps[is_sell])
+
+        first_buy = self._first_rows(is_buy, token_ids, n_tokens)
+        first_sell = self._first_rows(is_sell, token_ids, n_tokens)
+
+        profits = sell_usd - buy_usd
+        durations = last_sell_ts - first_buy_ts
+
+        # Same order as TradeAnalyzer: tokens in order of first appearance
+        traded = np.flatnonzero((n_buys > 0) & (n_sells > 0))
+        traded = traded[np.argsort(first_seen[traded], kind="stable")]
+
+        for t in traded:
+            buy_row, sell_row = first_buy[t], first_sell[t]
+            symbol = self.symbols[buy_row] or self.symbols[sell_row] or "UNKNOWN"
+            market_cap = self.market_caps[buy_row]
+
+            self.aggregated_trades.append(TokenTradeAggregate(
+                token=self.token_names[unique_tokens[t]],
+                profit_usd=round(float(profits[t]), 4),
+                duration_secs=float(durations[t]),
+                symbol=symbol,
+                total_buys=int(n_buys[t]),
+                total_sells=int(n_sells[t]),
+                market_cap_usd=None if np.isnan(market_cap) else float(market_cap)
+            ))
+
+    def _pick_unique_symbols(self, order: np.ndarray, symbols: List[str], seen: set) -> List[TokenTradeAggregate]:
+        picked = []
+        for i in order:
+            if symbols[i] not in seen:
+                picked.append(self.aggregated_trades[i])
+                seen.add(symbols[i])
+            if len(picked) == 3:
+                break
+        return picked
+
+    def analyze(self) -> Dict:
+        self.aggregate_trades()
+        trades = self.aggregated_trades
+
+        profits = np.array([t.profit_usd for t in trades], dtype=np.float64)
+        durations = np.array([t.duration_secs for t in trades], dtype=np.float64)
+        market_caps = np.array(
+            [t.market_cap_usd if t.market_cap_usd is not None else np.nan for t in trades],
+            dtype=np.float64
+        )
+        symbols = [t.symbol for t in trades]
+
+        # Filter best and worst trades without duplicate symbols
+        seen_symbols = set()
+        order = np.argsort(profits, kind="stable")
+        worst_trades = self._pick_unique_symbols(order, symbols, seen_symbols)
+        best_trades = self._pick_unique_symbols(order[::-1], symbols, seen_symbols)
+
+        n = len(trades)
+        win_rate = round(int(np.count_nonzero(profits > 0)) / n, 4) if n else 0.0
+        avg_hold_secs = float(durations.mean()) if n else 0
+        median_hold_secs = float(np.median(durations)) if n else 0
+
+        # Use real market cap for correlation
+        has_cap = ~np.isnan(market_caps)
+        correlation = None
+        if np.count_nonzero(has_cap) >= 2:
+            correlation = self._pearson(market_caps[has_cap], profits[has_cap])
+
+        # Best and Worst Tokens by total profit
+        best_token = None
+        worst_token = None
+        if n:
+            unique_symbols, first_seen, symbol_ids = np.unique(
+                np.asarray(symbols, dtype=object), return_index=True, return_inverse=True
+            )
+            if len(unique_symbols) > 2:
+                symbol_profits = np.bincount(symbol_ids, weights=profits)
+                by_appearance = np.argsort(first_seen, kind="stable")
+                ordered = symbol_profits[by_appearance]
+                best = by_appearance[int(np.argmax(ordered))]
+                worst = by_appearance[int(np.argmin(ordered))]
+                best_token = (unique_symbols[best], float(symbol_profits[best]))
+                worst_token = (unique_symbols[worst], float(symbol_profits[worst]))
+
+        # Date Range
+        if len(self.timestamps):
+            start_date = datetime.fromtimestamp(self.timestamps[0], timezone.utc).strftime("%Y-%m-%d")
+            end_date = datetime.fromtimestamp(self.timestamps[-1], timezone.utc).strftime("%Y-%m-%d")
+        else:
+            start_date = None
+            end_date = None
+
+        return {
+            "total_profit_usd": round(float(profits.sum()), 4),
+            "win_rate": win_rate,
+            "average_hold_time_human": self.calculate_human_readable_time(avg_hold_secs),
+            "median_hold_time_human": self.calculate_human_readable_time(median_hold_secs),
+            "best_trades": best_trades,
+            "worst_trades": worst_trades,
+            "profit_vs_market_cap_correlation": correlation,
+            "best_token_by_profit": best_token,
+            "worst_token_by_profit": worst_token,
+            "start_date": start_date,
+            "end_date": end_date,
+            "aggregated_trades": trades
+        }
+
+    def _pearson(self, x: np.ndarray, y: np.ndarray) -> Optional[float]:
+        """Vectorized form of TradeAnalyzer.calculate_pearson_correlation."""
+        n = len(x)
+        numerator = n * np.dot(x, y) - x.sum() * y.sum()
+        variance = (n * np.dot(x, x) - x.sum() ** 2) * (n * np.dot(y, y) - y.sum() ** 2)
+        if variance <= 0:
+            return None
+        return round(float(numerator / np.sqrt(variance)), 4)
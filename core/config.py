@@ -14,6 +14,15 @@ class BotConfig:
     db_base_path: str = "data/"
     export_path: str = "exports/"
     default_supply: int = 1_000_000_000
+    fetch_concurrency: int = 4
+    price_concurrency: int = 4
+    incremental_sync: bool = False
+    max_valid_transfers: int = 50
+    analysis_engine: str = "default"  # "default", "columnar" or "streaming"
+    lot_matching: str = "fifo"  # "fifo", "lifo" or "average"
+    cohort_concurrency: int = 8
+    json_logs: bool = False  # write session logs as JSON lines
+    profile_sessions: bool = True  # add stage timings and call counts to the result
 
 def save_config(config: BotConfig, path: Path = CONFIG_FILE) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
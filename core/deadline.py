@@ -0,0 +1,45 @@
+import math
+import threading
+import time
+from typing import Optional
+
+class DeadlineExceeded(Exception):
+    """Raised when work is started after its deadline passed or it was cancelled."""
+
+class Deadline:
+    """
+    Cooperative time budget shared by a session's pipeline stages. Stages
+    poll remaining()/expired() and wind down themselves, so the session still
+    stores and returns a best-effort result instead of being killed.
+    cancel() ends the budget early for every stage holding it.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, _cancelled: Optional[threading.Event] = None):
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self._cancelled = _cancelled or threading.Event()
+
+    def remaining(self) -> float:
+        if self._cancelled.is_set():
+            return 0.0
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("Session deadline reached")
+
+    def child(self, seconds: Optional[float]) -> "Deadline":
+        """A sub-budget of at most `seconds` that never outlives this one and shares its cancellation."""
+        limit = self.remaining() if seconds is None else min(max(0.0, seconds), self.remaining())
+        return Deadline(None if math.isinf(limit) else limit, self._cancelled)
+
+    def timeout(self, default: float) -> float:
+        """Socket timeout for one call: the default, capped by what is left."""
+        return max(0.001, min(default, self.remaining()))
@@ -1,7 +1,10 @@
 import time
+import asyncio
 import functools
 import logging
 
+from .profiler import span
+
 # Optional: configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
@@ -34,11 +37,22 @@ def log_calls(func):
 
 
 def timeit(func):
+    """Log the wall time of each call and record it as a span of the active profile."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            with span(func.__name__):
+                result = await func(*args, **kwargs)
+            logging.info(f"[timeit] {func.__name__} took {time.perf_counter() - start:.4f} seconds")
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        end = time.time()
-        logging.info(f"[timeit] {func.__name__} took {end - start:.4f} seconds")
+        start = time.perf_counter()
+        with span(func.__name__):
+            result = func(*args, **kwargs)
+        logging.info(f"[timeit] {func.__name__} took {time.perf_counter() - start:.4f} seconds")
         return result
     return wrapper
@@ -1,37 +1,46 @@
-import sqlite3
-import requests
+import asyncio
 import math
-import time
 import logging
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 from collections import defaultdict
-from datetime import datetime
 from .market_data import BirdeyeMarketDataProvider
+from .deadline import Deadline, DeadlineExceeded
+from .http_client import send_request
 from .config import load_config
+from .storage import TransferStore
+from .metadata_cache import TokenMetadataCache, get_metadata_cache
+from .candle_store import CandleStore, get_candle_store
+from .metrics import get_metrics
+from .price_planner import MAX_CANDLES_PER_REQUEST, coalesce_ranges, nearest_price
 
 class DatabaseEnricher:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+    def __init__(
+        self,
+        store: TransferStore,
+        cache: Optional[TokenMetadataCache] = None,
+        deadline: Optional[Deadline] = None
+    ):
+        self.store = store
+        self.cache = cache or get_metadata_cache()
+        self.deadline = deadline
         self.api_url = "https://api-v3.raydium.io/mint/ids"
 
     def get_unique_tokens(self) -> List[str]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT token FROM raw_transfers WHERE token IS NOT NULL AND token != ''")
-        tokens = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return tokens
+        return self.store.get_unique_tokens()
 
     def fetch_token_metadata(self, mints: List[str]) -> List[dict]:
         result = []
         unknown_counter = 1
 
         for i in range(0, len(mints), 20):
+            if self.deadline is not None and self.deadline.expired():
+                # Out of time: the remaining mints stay without metadata and are cleaned out
+                break
             batch = mints[i:i+20]
             params = {"mints": ",".join(batch)}
 
             try:
-                response = requests.get(self.api_url, params=params)
+                response = send_request("raydium", "GET", self.api_url, deadline=self.deadline, params=params)
                 response.raise_for_status()
                 data = response.json()
             except Exception:
@@ -60,90 +69,172 @@ class DatabaseEnricher:
         return result
 
     def update_database(self, metadata: List[dict]):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        for token in metadata:
-            divisor = 10 ** token["decimals"] if token["decimals"] else 1
-            cursor.execute("""
-                UPDATE raw_transfers
-                SET
-                    token_symbol = ?,
-                    token_name = ?,
-                    decimals = ?,
-                    amount_human = amount / ?
-                WHERE token = ?
-            """, (
-                token["symbol"],
-                token["name"],
-                token["decimals"],
-                divisor,
-                token["address"]
-            ))
-        conn.commit()
-        conn.close()
+        self.store.update_metadata(metadata)
 
     def run(self):
         tokens = self.get_unique_tokens()
-        metadata = self.fetch_token_metadata(tokens)
-        self.update_database(metadata)
+        cached = self.cache.get_many(tokens)
+        misses = [token for token in tokens if token not in cached]
+        metrics = get_metrics()
+        metrics.inc("trench_cache_lookups_total", len(cached), cache="metadata", result="hit")
+        metrics.inc("trench_cache_lookups_total", len(misses), cache="metadata", result="miss")
+
+        fetched = self.fetch_token_metadata(misses) if misses else []
+        # Unknown mints, and ones Raydium returns without a symbol, are retried on the next run rather than cached
+        self.cache.put_many([m for m in fetched if m["symbol"] and not m["symbol"].startswith("UNKNOWN_")])
+
+        self.update_database(list(cached.values()) + fetched)
 
 class PriceEnricher:
-    def __init__(self, db_path: str, provider: BirdeyeMarketDataProvider):
-        self.db_path = db_path
+    def __init__(
+        self,
+        store: TransferStore,
+        provider: BirdeyeMarketDataProvider,
+        candles: Optional[CandleStore] = None,
+        seconds_window: int = 300,
+        max_in_flight: int = 4,
+        logger=None,
+        flush_size: int = 500,
+        deadline: Optional[Deadline] = None,
+        on_flush: Optional[Callable[[List[int]], None]] = None
+    ):
+        self.store = store
         self.provider = provider
+        self.candles = candles or get_candle_store()
+        self.seconds_window = seconds_window
+        self.max_in_flight = max_in_flight
+        self.logger = logger
+        self.flush_size = flush_size
+        self.deadline = deadline
+        # Called off the event loop with the rowids of every batch of prices written
+        self.on_flush = on_flush
         self.config = load_config()
-
-    def run(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT rowid, token, timestamp, amount_human
-            FROM raw_transfers
-            WHERE price_usd IS NULL
-            AND token IS NOT NULL
-            AND amount_human IS NOT NULL
-        """)
-        rows = cursor.fetchall()
-
-        token_time_map: Dict[Tuple[str, int], List[Tuple[int, float]]] = defaultdict(list)
-
-        for rowid, token, timestamp, amount_human in rows:
-            rounded_ts = int(round(timestamp / 10) * 10)
-            token_time_map[(token, rounded_ts)].append((rowid, amount_human))
-
-        for (token_address, rounded_ts), entries in token_time_map.items():
-            dt_object = datetime.utcfromtimestamp(rounded_ts)
-
+        self.failures: List[dict] = []
+        self.skipped_ranges = 0
+
+    def plan_requests(self, token_address: str, timestamps: List[int]) -> List[Tuple[int, int]]:
+        """Minute ranges to request so every ±seconds_window around the timestamps is stored."""
+        missing = []
+        hits = 0
+        for ts in timestamps:
+            window_from = (ts - self.seconds_window) // 60
+            window_to = (ts + self.seconds_window) // 60
+            gaps = self.candles.missing_ranges(token_address, window_from, window_to)
+            hits += not gaps
+            missing.extend(gaps)
+        metrics = get_metrics()
+        metrics.inc("trench_cache_lookups_total", hits, cache="candles", result="hit")
+        metrics.inc("trench_cache_lookups_total", len(timestamps) - hits, cache="candles", result="miss")
+        return coalesce_ranges(missing, max_span=MAX_CANDLES_PER_REQUEST)
+
+    async def fetch_range(self, semaphore: asyncio.Semaphore, token_address: str, range_from: int, range_to: int):
+        """Fetch one planned range into the candle store, recording a failure instead of raising."""
+        async with semaphore:
             try:
-                prices = self.provider.get_price_history(token_address, dt_object)
-                if not prices:
-                    continue
-
-                best_price = min(
-                    prices,
-                    key=lambda p: abs((p.timestamp - dt_object).total_seconds())
+                if self.deadline is not None:
+                    self.deadline.check()
+                fetched = await asyncio.to_thread(
+                    self.provider.get_price_range, token_address, range_from * 60, range_to * 60 + 59,
+                    self.deadline
                 )
-                price_usd = best_price.price_usd
-                market_cap_usd = price_usd * self.config.default_supply
-
-                for rowid, amount_human in entries:
-                    amount_usd = amount_human * price_usd
-
-                    cursor.execute("""
-                        UPDATE raw_transfers
-                        SET
-                            price_usd = ?,
-                            amount_usd = ?,
-                            market_cap_usd = ?
-                        WHERE rowid = ?
-                    """, (price_usd, amount_usd, market_cap_usd, rowid))
-
-                conn.commit()
-            except Exception:
-                # Silently skip any broken token fetch
+            except DeadlineExceeded:
+                self.skipped_ranges += 1
+                return
+            except Exception as e:
+                self.failures.append({
+                    "token": token_address,
+                    "time_from": range_from * 60,
+                    "time_to": range_to * 60 + 59,
+                    "error": str(e)
+                })
+                return
+        await asyncio.to_thread(self.candles.store, token_address, range_from, range_to, fetched)
+
+    def resolve_token(self, token_address: str, buckets: Dict[int, List[Tuple[int, float]]]) -> List[Tuple[float, float, float, int]]:
+        """Resolve every bucket of a token from its sorted stored candles."""
+        candles = self.candles.get_prices(
+            token_address,
+            (min(buckets) - self.seconds_window) // 60,
+            (max(buckets) + self.seconds_window) // 60
+        )
+        times = [unix_time for unix_time, _ in candles]
+        prices = [price for _, price in candles]
+
+        updates = []
+        for rounded_ts, entries in buckets.items():
+            price_usd = nearest_price(times, prices, rounded_ts, max_distance=self.seconds_window + 59)
+            if price_usd is None:
+                self.failures.append({
+                    "token": token_address,
+                    "timestamp": rounded_ts,
+                    "error": "no price candle in window"
+                })
                 continue
+            market_cap_usd = price_usd * self.config.default_supply
+            for rowid, amount_human in entries:
+                updates.append((price_usd, amount_human * price_usd, market_cap_usd, rowid))
+        return updates
+
+    async def _price_token(
+        self,
+        semaphore: asyncio.Semaphore,
+        token_address: str,
+        buckets: Dict[int, List[Tuple[int, float]]],
+        pending: List[Tuple[float, float, float, int]]
+    ):
+        """Fetch a token's planned ranges, resolve its transfers and flush once enough updates pile up."""
+        await asyncio.gather(*(
+            self.fetch_range(semaphore, token_address, range_from, range_to)
+            for range_from, range_to in self.plan_requests(token_address, list(buckets))
+        ))
+        pending.extend(self.resolve_token(token_address, buckets))
+        if len(pending) >= self.flush_size:
+            chunk = pending[:]
+            pending.clear()
+            await self._flush(chunk)
+
+    async def _flush(self, updates: List[Tuple[float, float, float, int]]):
+        await asyncio.to_thread(self.store.update_prices, updates)
+        if self.on_flush is not None:
+            await asyncio.to_thread(self.on_flush, [rowid for *_, rowid in updates])
+
+    async def run_async(self):
+        """
+        Price every unpriced transfer: planned ranges for all tokens are fetched
+        concurrently (at most max_in_flight at once, paced by the shared rate
+        limiter), and prices are written back in batches of flush_size so an
+        interrupted run keeps what it already resolved.
+        """
+        rows = await asyncio.to_thread(self.store.get_unpriced_transfers)
+
+        token_buckets: Dict[str, Dict[int, List[Tuple[int, float]]]] = defaultdict(lambda: defaultdict(list))
 
-            time.sleep(1)  # Respect rate limit
+        for rowid, token, timestamp, amount_human in rows:
+            rounded_ts = int(round(timestamp / 10) * 10)
+            token_buckets[token][rounded_ts].append((rowid, amount_human))
+
+        # Tokens with the most transfers go first, so a tight deadline drops the cheapest lookups
+        ordered = sorted(token_buckets.items(), key=lambda item: -sum(len(e) for e in item[1].values()))
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        pending: List[Tuple[float, float, float, int]] = []
+        await asyncio.gather(*(
+            self._price_token(semaphore, token_address, buckets, pending)
+            for token_address, buckets in ordered
+        ))
+        if pending:
+            await self._flush(pending)
+
+        if self.skipped_ranges and self.logger:
+            self.logger.log(
+                f"Deadline reached: {self.skipped_ranges} price ranges skipped, priced from stored candles only.",
+                level="WARNING"
+            )
+
+        if self.failures and self.logger:
+            self.logger.log(f"{len(self.failures)} price lookups failed.", level="WARNING")
+            for failure in self.failures:
+                self.logger.log(f"Price lookup failed: {failure}", level="WARNING")
 
-        conn.close()
+    def run(self):
+        asyncio.run(self.run_async())
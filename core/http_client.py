@@ -0,0 +1,85 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .deadline import Deadline
+from .metrics import get_metrics
+from .profiler import record_http
+from .rate_limiter import get_rate_limiter
+
+POOL_SIZE = 16
+MAX_429_RETRIES = 3
+DEFAULT_RETRY_AFTER = 5.0
+# Per-call socket timeout when a deadline is given
+REQUEST_TIMEOUT = 30.0
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide keep-alive session shared by all API clients."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+def send_request(
+    provider: str,
+    method: str,
+    url: str,
+    deadline: Optional[Deadline] = None,
+    **kwargs
+) -> requests.Response:
+    """
+    Send a request through the shared session once the provider's rate limit
+    allows it. A 429 pauses the provider for every bot process for the
+    Retry-After period and the request is retried. With a deadline, the call
+    raises DeadlineExceeded instead of waiting or reading past it. Every
+    attempt is counted against the active profile and the shared metrics.
+    """
+    session = get_http_session()
+    limiter = get_rate_limiter()
+    metrics = get_metrics()
+
+    for attempt in range(MAX_429_RETRIES + 1):
+        limiter.acquire(provider, deadline)
+        if deadline is not None:
+            kwargs["timeout"] = deadline.timeout(REQUEST_TIMEOUT)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.inc("trench_provider_requests_total", provider=provider, status="error")
+            raise
+        elapsed = time.perf_counter() - start
+        record_http(provider, response, elapsed, retried=attempt > 0)
+        metrics.inc("trench_provider_requests_total", provider=provider, status=response.status_code)
+        metrics.observe("trench_provider_request_seconds", elapsed, provider=provider)
+        if response.status_code != 429 or attempt == MAX_429_RETRIES:
+            return response
+        limiter.penalize(provider, parse_retry_after(response.headers.get("Retry-After")))
+    return response
@@ -0,0 +1,136 @@
+import math
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from .models import Transaction, TransactionBatch, RoundTrip
+
+# Quantities below this are treated as fully matched (float dust)
+EPSILON = 1e-9
+
+class _Lot:
+    __slots__ = ("signature", "symbol", "timestamp", "remaining", "unit_cost")
+
+    def __init__(self, signature: str, symbol: Optional[str], timestamp: float, remaining: float, unit_cost: float):
+        self.signature = signature
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.remaining = remaining
+        self.unit_cost = unit_cost
+
+class LotMatcher:
+    """
+    Matches each SELL against open BUY lots of the same token and emits one
+    RoundTrip per matched (buy, sell) pair, with realized PnL and exact hold
+    time. Partial fills split a lot across several round trips.
+
+    - fifo: oldest open lot first
+    - lifo: newest open lot first
+    - average: lots consumed oldest first (for hold time), but cost basis is
+      the running average cost of everything still open
+
+    Transfers must be fed in time order per token. Each one is pushed or
+    popped on its token's deque at most once per matched lot, so the whole
+    pass is linear. Open lots keep only ids and numbers, never the transfer.
+    """
+
+    METHODS = ("fifo", "lifo", "average")
+
+    def __init__(self, method: str = "fifo"):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown lot matching method: {method}")
+        self.method = method
+        self.trades: List[RoundTrip] = []
+        self.open_lots: Dict[str, Deque[_Lot]] = defaultdict(deque)
+        self.open_quantity: Dict[str, float] = defaultdict(float)
+        self.open_cost: Dict[str, float] = defaultdict(float)
+
+    def add(self, tx: Transaction):
+        self.add_fill(
+            tx.token_address, tx.token_symbol, tx.signature, tx.timestamp.timestamp(),
+            tx.type, tx.amount, tx.amount_usd
+        )
+
+    def add_fill(
+        self,
+        token: str,
+        symbol: Optional[str],
+        signature: str,
+        timestamp: float,
+        action: str,
+        amount: float,
+        amount_usd: Optional[float]
+    ):
+        """Feed one transfer as plain values (timestamp in epoch seconds)."""
+        if not amount:
+            return
+        amount_usd = amount_usd or 0
+
+        if action == "BUY":
+            self.open_lots[token].append(_Lot(signature, symbol, timestamp, amount, amount_usd / amount))
+            self.open_quantity[token] += amount
+            self.open_cost[token] += amount_usd
+        elif action == "SELL":
+            self._match_sell(token, symbol, signature, timestamp, amount, amount_usd / amount)
+
+    def _match_sell(self, token: str, symbol: Optional[str], signature: str, timestamp: float, amount: float, unit_proceeds: float):
+        lots = self.open_lots[token]
+        remaining = amount
+
+        while remaining > EPSILON and lots:
+            lot = lots[-1] if self.method == "lifo" else lots[0]
+            quantity = min(remaining, lot.remaining)
+
+            if self.method == "average":
+                cost_basis = self.open_cost[token] / self.open_quantity[token]
+            else:
+                cost_basis = lot.unit_cost
+
+            self.trades.append(RoundTrip(
+                token_address=token,
+                token_symbol=lot.symbol or symbol,
+                buy_signature=lot.signature,
+                sell_signature=signature,
+                amount=quantity,
+                profit_usd=round(quantity * (unit_proceeds - cost_basis), 4),
+                duration_secs=timestamp - lot.timestamp
+            ))
+
+            lot.remaining -= quantity
+            remaining -= quantity
+            self.open_quantity[token] -= quantity
+            self.open_cost[token] -= quantity * cost_basis
+
+            if lot.remaining <= EPSILON:
+                if self.method == "lifo":
+                    lots.pop()
+                else:
+                    lots.popleft()
+        # Any unmatched remainder was bought before the fetched history and is ignored
+
+    def match(self, transactions: Iterable[Transaction]) -> List[RoundTrip]:
+        for tx in transactions:
+            self.add(tx)
+        return self.trades
+
+    def match_batch(self, batch: TransactionBatch) -> List[RoundTrip]:
+        """
+        Match straight from a TransactionBatch's per-token column views,
+        without building a Transaction per row. Round trips come out grouped
+        by token. Note that this regroups the batch's rows by token.
+        """
+        actions = TransactionBatch.ACTIONS
+        for token in batch.tokens:
+            view = batch.token_view(token)
+            for i in range(len(view["timestamps"])):
+                amount_usd = view["amount_usd"][i]
+                symbol_id = view["symbol_ids"][i]
+                self.add_fill(
+                    token,
+                    batch.symbols[symbol_id] if symbol_id >= 0 else None,
+                    str(view["row_ids"][i]),
+                    view["timestamps"][i],
+                    actions[view["actions"][i]],
+                    view["amounts"][i],
+                    None if math.isnan(amount_usd) else amount_usd
+                )
+        return self.trades
@@ -1,8 +1,11 @@
+import threading
 from abc import ABC, abstractmethod
 from typing import List, Optional
-from datetime import datetime
-import requests
+from datetime import datetime, timezone
 
+from .api_key_manager import APIKeyManager
+from .deadline import Deadline
+from .http_client import send_request
 from .models import MarketData
 
 class MarketDataProvider(ABC):
@@ -14,27 +17,81 @@ class MarketDataProvider(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_price_range(
+        self,
+        token_address: str,
+        time_from: int,
+        time_to: int,
+        deadline: Optional[Deadline] = None
+    ) -> List[MarketData]:
+        """
+        Fetch every price point between two unix timestamps.
+        """
+        pass
+
+# Responses meaning the key itself is rejected or out of quota, not that the request was bad
+KEY_ERROR_STATUSES = (401, 402)
+# A 403 only condemns the key when its body blames the key (otherwise it may be a WAF or geo block)
+KEY_ERROR_MARKERS = ("api key", "api-key", "apikey")
+# Keys retired by one request at most; a request still rejected after that just fails
+MAX_KEY_ROTATIONS = 1
+
+def _key_rejected(response) -> bool:
+    if response.status_code in KEY_ERROR_STATUSES:
+        return True
+    if response.status_code != 403:
+        return False
+    body = response.text.lower()
+    return any(marker in body for marker in KEY_ERROR_MARKERS)
+
 class BirdeyeMarketDataProvider(MarketDataProvider):
-    def __init__(self, api_key: str, logger=None):
+    def __init__(self, api_key: str, logger=None, key_manager: Optional[APIKeyManager] = None):
         self.api_key = api_key
         self.base_url = "https://public-api.birdeye.so/defi/history_price"
         self.logger = logger
+        # With a key manager, a rejected key is retired and the next one is used
+        self.key_manager = key_manager
+        self._key_lock = threading.Lock()
+
+    @classmethod
+    def from_key_file(cls, key_file: str, logger=None) -> "BirdeyeMarketDataProvider":
+        """Provider holding the next key from key_file, rotating when it is rejected."""
+        key_manager = APIKeyManager(key_file)
+        return cls(api_key=key_manager.get_key(), logger=logger, key_manager=key_manager)
+
+    def _rotate_key(self, rejected_key: str):
+        with self._key_lock:
+            # Concurrent requests failing on the same key rotate it only once
+            if self.api_key == rejected_key:
+                self.api_key = self.key_manager.rotate()
+                if self.logger:
+                    self.logger.log("Birdeye key rejected; rotated to the next key.", level="WARNING")
 
     def get_price_history(self, token_address: str, center_time: datetime, seconds_window: int = 300) -> List[MarketData]:
         """
         Fetch price data from Birdeye in a ±window around the center timestamp (default: ±5min).
         """
-        results = []
         unix_center = int(center_time.timestamp())
-        time_from = unix_center - seconds_window
-        time_to = unix_center + seconds_window
-
-        headers = {
-            "accept": "application/json",
-            "x-chain": "solana",
-            "X-API-KEY": self.api_key
-        }
+        try:
+            return self.get_price_range(token_address, unix_center - seconds_window, unix_center + seconds_window)
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"Birdeye API failed for {token_address}: {e}", level="WARNING")
+            else:
+                print(f"Birdeye API failed for {token_address}: {e}")
+            return []
 
+    def get_price_range(
+        self,
+        token_address: str,
+        time_from: int,
+        time_to: int,
+        deadline: Optional[Deadline] = None
+    ) -> List[MarketData]:
+        """
+        Fetch all 1m price candles between two unix timestamps. Errors are raised to the caller.
+        """
         params = {
             "address": token_address,
             "address_type": "token",
@@ -43,30 +100,34 @@ class BirdeyeMarketDataProvider(MarketDataProvider):
             "time_to": time_to
         }
 
-        try:
-            response = requests.get(self.base_url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            items = data.get("data", {}).get("items", [])
-            for item in items:
-                price_usd = item.get("value")
-                if price_usd is None:
-                    continue
+        for attempt in range(MAX_KEY_ROTATIONS + 1):
+            api_key = self.api_key
+            headers = {
+                "accept": "application/json",
+                "x-chain": "solana",
+                "X-API-KEY": api_key
+            }
+            response = send_request("birdeye", "GET", self.base_url, deadline=deadline, headers=headers, params=params)
+            if self.key_manager is None or attempt == MAX_KEY_ROTATIONS or not _key_rejected(response):
+                break
+            # Raises once every key is used up
+            self._rotate_key(api_key)
+        response.raise_for_status()
+        data = response.json()
 
-                timestamp = datetime.utcfromtimestamp(item["unixTime"])
-                results.append(MarketData(
-                    token_address=token_address,
-                    timestamp=timestamp,
-                    price_usd=price_usd,
-                    volume_usd=None,
-                    market_cap_usd=None
-                ))
+        results = []
+        items = data.get("data", {}).get("items", [])
+        for item in items:
+            price_usd = item.get("value")
+            if price_usd is None:
+                continue
 
-        except Exception as e:
-            if self.logger:
-                self.logger.log(f"Birdeye API failed for {token_address}: {e}", level="WARNING")
-            else:
-                print(f"Birdeye API failed for {token_address}: {e}")
+            results.append(MarketData(
+                token_address=token_address,
+                timestamp=datetime.fromtimestamp(item["unixTime"], timezone.utc),
+                price_usd=price_usd,
+                volume_usd=None,
+                market_cap_usd=None
+            ))
 
         return results
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from .profiler import trace_sql
+
+METADATA_CACHE_DB = "/var/data/token_metadata.db"
+DEFAULT_TTL_SECS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50_000
+SQL_BATCH = 500
+
+class TokenMetadataCache:
+    """
+    On-disk mint -> (symbol, name, decimals) cache shared by every bot process.
+    Entries expire after ttl_secs; once the cache grows past max_entries the
+    least recently read entries are evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: str = METADATA_CACHE_DB,
+        ttl_secs: int = DEFAULT_TTL_SECS,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.db_path = db_path
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_metadata (
+                    mint TEXT PRIMARY KEY,
+                    symbol TEXT,
+                    name TEXT,
+                    decimals INTEGER,
+                    fetched_at REAL,
+                    last_access REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_token_metadata_access ON token_metadata (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = trace_sql(sqlite3.connect(self.db_path, timeout=30))
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, mints: List[str]) -> Dict[str, dict]:
+        """Return fresh cached metadata for the given mints, keyed by mint."""
+        conn = self._connect()
+        now = time.time()
+        found: Dict[str, dict] = {}
+
+        for i in range(0, len(mints), SQL_BATCH):
+            batch = mints[i:i + SQL_BATCH]
+            placeholders = ",".join("?" for _ in batch)
+            cursor = conn.execute(f"""
+                SELECT mint, symbol, name, decimals FROM token_metadata
+                WHERE mint IN ({placeholders}) AND fetched_at >= ?
+            """, (*batch, now - self.ttl_secs))
+            for mint, symbol, name, decimals in cursor.fetchall():
+                found[mint] = {"address": mint, "symbol": symbol, "name": name, "decimals": decimals}
+
+        if found:
+            with conn:
+                conn.executemany(
+                    "UPDATE token_metadata SET last_access = ? WHERE mint = ?",
+                    [(now, mint) for mint in found]
+                )
+        return found
+
+    def put_many(self, metadata: List[dict]):
+        if not metadata:
+            return
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.executemany("""
+                INSERT INTO token_metadata (mint, symbol, name, decimals, fetched_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(mint) DO UPDATE SET
+                    symbol = excluded.symbol,
+                    name = excluded.name,
+                    decimals = excluded.decimals,
+                    fetched_at = excluded.fetched_at,
+                    last_access = excluded.last_access
+            """, [
+                (token["address"], token["symbol"], token["name"], token["decimals"], now, now)
+                for token in metadata
+            ])
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        count = conn.execute("SELECT COUNT(*) FROM token_metadata").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute("""
+            DELETE FROM token_metadata WHERE mint IN (
+                SELECT mint FROM token_metadata ORDER BY last_access ASC LIMIT ?
+            )
+        """, (count - self.max_entries,))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_metadata_cache() -> TokenMetadataCache:
+    """Return the process-wide metadata cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TokenMetadataCache()
+        return _cache
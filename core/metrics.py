@@ -0,0 +1,158 @@
+import atexit
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_DB = "/var/data/metrics.db"
+# Buffered increments are written at most this long after they happen
+FLUSH_SECS = 5
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SESSION_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 3600)
+
+# family -> (type, help); only these families are exported
+FAMILIES = {
+    "trench_provider_requests_total": ("counter", "HTTP requests sent per provider and status code."),
+    "trench_provider_request_seconds": ("histogram", "HTTP request latency per provider."),
+    "trench_session_duration_seconds": ("histogram", "Session and cohort run time by outcome."),
+    "trench_cache_lookups_total": ("counter", "Metadata and candle cache lookups by result."),
+}
+
+def _labels_key(labels: Dict[str, str]) -> str:
+    return json.dumps({k: str(v) for k, v in labels.items()}, sort_keys=True)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class MetricsCollector:
+    """
+    Counters and histograms shared by every process (API, worker threads and
+    standalone launchers). Increments are buffered in memory and added to one
+    SQLite table in a single transaction per flush, so each process only
+    ever writes deltas and the table always holds the totals. Histograms are
+    stored as their cumulative _bucket/_sum/_count samples.
+    """
+
+    def __init__(self, db_path: str = METRICS_DB, flush_secs: float = FLUSH_SECS):
+        self.db_path = db_path
+        self.flush_secs = flush_secs
+        self._pending: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    family TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (name, labels)
+                )
+            """)
+
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_secs)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Failed to flush metrics: {e}")
+
+    def _add(self, family: str, name: str, labels: Dict[str, str], amount: float):
+        with self._lock:
+            self._pending[(family, name, _labels_key(labels))] += amount
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        self._add(name, name, labels, amount)
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS, **labels):
+        # Every bucket gets a row, so the exposition always lists the full ladder
+        for bound in list(buckets) + [math.inf]:
+            self._add(name, f"{name}_bucket", {**labels, "le": _format_value(bound)}, 1 if value <= bound else 0)
+        self._add(name, f"{name}_sum", labels, value)
+        self._add(name, f"{name}_count", labels, 1)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        if not pending:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany("""
+                INSERT INTO samples (family, name, labels, value) VALUES (?, ?, ?, ?)
+                ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value
+            """, [(family, name, labels, value) for (family, name, labels), value in pending.items()])
+
+    def render(self, gauges: Optional[List[Tuple[str, str, List[Tuple[Dict[str, str], float]]]]] = None) -> str:
+        """
+        Prometheus text exposition of the stored totals, followed by gauges
+        given as (name, help, [(labels, value), ...]) computed by the caller.
+        """
+        self.flush()
+        rows = self._connect().execute("SELECT family, name, labels, value FROM samples").fetchall()
+
+        samples = []
+        for family, name, labels, value in rows:
+            if family not in FAMILIES:
+                continue
+            labels = json.loads(labels)
+            series = _labels_key({k: v for k, v in labels.items() if k != "le"})
+            # Histogram series read bucket ladder (ascending le), then _sum and _count
+            order = (series, name != f"{family}_bucket", name, float(labels.get("le", 0)))
+            samples.append((family, order, f"{name}{_format_labels(labels)} {_format_value(value)}"))
+
+        by_family: Dict[str, List[str]] = defaultdict(list)
+        for family, _, line in sorted(samples, key=lambda sample: sample[1]):
+            by_family[family].append(line)
+
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(by_family.get(family, []))
+        for name, help_text, values in gauges or []:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in values)
+        return "\n".join(lines) + "\n"
+
+_collector = None
+_collector_lock = threading.Lock()
+
+def get_metrics() -> MetricsCollector:
+    """Return the process-wide metrics collector."""
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = MetricsCollector()
+            atexit.register(_collector.flush)
+        return _collector
@@ -1,6 +1,9 @@
+import math
+import sys
+from array import array
 from dataclasses import dataclass
-from typing import Optional, Literal, List, Tuple
-from datetime import datetime
+from typing import Optional, Literal, List, Tuple, Dict
+from datetime import datetime, timezone
 
 @dataclass
 class Transaction:
@@ -22,14 +25,18 @@ class MarketData:
     volume_usd: Optional[float]
     market_cap_usd: Optional[float]
 
-@dataclass
-class Trade:
-    buy_tx: Transaction
-    sell_tx: Transaction
+@dataclass(slots=True)
+class RoundTrip:
+    """One matched (buy lot, sell) pair; holds ids rather than the transfers themselves."""
+    token_address: str
+    token_symbol: Optional[str]
+    buy_signature: str
+    sell_signature: str
+    amount: float  # token quantity matched; less than the buy on a partial fill
     profit_usd: float
     duration_secs: float
 
-@dataclass
+@dataclass(slots=True)
 class TokenTradeAggregate:
     token: str
     symbol: str
@@ -39,6 +46,118 @@ class TokenTradeAggregate:
     total_sells: int
     market_cap_usd: Optional[float] = None
 
+class TransactionBatch:
+    """
+    Column-oriented batch of BUY/SELL transfers. Numeric fields live in typed
+    arrays (NaN stands for a missing USD value or market cap) and tokens and
+    symbols are interned to integer ids, so a row costs a few dozen bytes
+    instead of a Transaction object with its datetime. After group_by_token()
+    each token's rows are contiguous and token_view() returns zero-copy
+    memoryview slices; NumPy can wrap any column with np.frombuffer.
+    """
+
+    ACTIONS = ("BUY", "SELL", "TRANSFER", "UNKNOWN")
+    __slots__ = (
+        "row_ids", "timestamps", "token_ids", "symbol_ids", "amounts",
+        "amount_usd", "market_caps", "actions", "tokens", "symbols",
+        "_token_index", "_symbol_index", "_offsets"
+    )
+
+    def __init__(self):
+        self.row_ids = array("q")
+        self.timestamps = array("q")
+        self.token_ids = array("l")
+        self.symbol_ids = array("l")  # -1 = no symbol
+        self.amounts = array("d")
+        self.amount_usd = array("d")
+        self.market_caps = array("d")
+        self.actions = array("b")
+        self.tokens: List[str] = []
+        self.symbols: List[str] = []
+        self._token_index: Dict[str, int] = {}
+        self._symbol_index: Dict[str, int] = {}
+        self._offsets: Optional[Dict[int, Tuple[int, int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _intern(self, value: str, table: List[str], index: Dict[str, int]) -> int:
+        idx = index.get(value)
+        if idx is None:
+            idx = index[value] = len(table)
+            table.append(sys.intern(value))
+        return idx
+
+    def append_row(self, row: tuple):
+        """Append a row shaped like TransferStore.load_trade_rows()."""
+        rowid, timestamp, token, symbol, amount, amount_usd, market_cap, action, _ = row
+        self.row_ids.append(rowid)
+        self.timestamps.append(int(timestamp))
+        self.token_ids.append(self._intern(token, self.tokens, self._token_index))
+        self.symbol_ids.append(self._intern(symbol, self.symbols, self._symbol_index) if symbol else -1)
+        self.amounts.append(amount or 0.0)
+        self.amount_usd.append(math.nan if amount_usd is None else amount_usd)
+        self.market_caps.append(math.nan if market_cap is None else market_cap)
+        self.actions.append(self.ACTIONS.index(action) if action in self.ACTIONS else self.ACTIONS.index("UNKNOWN"))
+        self._offsets = None
+
+    @classmethod
+    def from_cursor(cls, cursor, batch_size: int = 10_000) -> "TransactionBatch":
+        """Build straight from a cursor over load_trade_rows()-shaped rows."""
+        batch = cls()
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return batch
+            for row in rows:
+                batch.append_row(row)
+
+    def group_by_token(self):
+        """Reorder rows so each token is contiguous, keeping time order within a token."""
+        order = sorted(range(len(self)), key=lambda i: (self.token_ids[i], self.timestamps[i], i))
+        for name in ("row_ids", "timestamps", "token_ids", "symbol_ids", "amounts", "amount_usd", "market_caps", "actions"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in order)))
+
+        self._offsets = {}
+        start = 0
+        for i in range(1, len(self) + 1):
+            if i == len(self) or self.token_ids[i] != self.token_ids[start]:
+                self._offsets[self.token_ids[start]] = (start, i)
+                start = i
+
+    def token_view(self, token: str) -> Dict[str, memoryview]:
+        """Zero-copy views of every column for one token's rows."""
+        if self._offsets is None:
+            self.group_by_token()
+        token_id = self._token_index.get(token)
+        start, end = self._offsets.get(token_id, (0, 0))
+        return {
+            name: memoryview(getattr(self, name))[start:end]
+            for name in ("row_ids", "timestamps", "symbol_ids", "amounts", "amount_usd", "market_caps", "actions")
+        }
+
+    def symbol_of(self, i: int) -> Optional[str]:
+        symbol_id = self.symbol_ids[i]
+        return self.symbols[symbol_id] if symbol_id >= 0 else None
+
+    def to_transactions(self) -> List[Transaction]:
+        """Materialize Transaction objects, e.g. for TradeAnalyzer."""
+        return [
+            Transaction(
+                signature=str(self.row_ids[i]),
+                timestamp=datetime.fromtimestamp(self.timestamps[i], timezone.utc),
+                token_address=self.tokens[self.token_ids[i]],
+                token_symbol=self.symbol_of(i),
+                amount=self.amounts[i],
+                amount_usd=None if math.isnan(self.amount_usd[i]) else self.amount_usd[i],
+                market_cap_usd=None if math.isnan(self.market_caps[i]) else self.market_caps[i],
+                type=self.ACTIONS[self.actions[i]],
+                source=None
+            )
+            for i in range(len(self))
+        ]
+
 @dataclass
 class SessionResult:
     session_id: str
@@ -50,16 +169,18 @@ class SessionResult:
     average_hold_time_human: str
     median_hold_time_human: str
     profit_vs_market_cap_correlation: Optional[float]
-    best_trades: List[Trade]
-    worst_trades: List[Trade]
+    best_trades: List[TokenTradeAggregate]
+    worst_trades: List[TokenTradeAggregate]
     best_token_by_profit: Optional[Tuple[str, float]]
     worst_token_by_profit: Optional[Tuple[str, float]]
     start_date: Optional[str]
     end_date: Optional[str]
     aggregated_trades: Optional[List[TokenTradeAggregate]] = None
+    round_trips: Optional[List[RoundTrip]] = None
+    profile: Optional[dict] = None
 
     def to_dict(self) -> dict:
-        return {
+        result = {
             "session_id": self.session_id,
             "wallet_address": self.wallet_address,
             "timestamp_started": self.timestamp_started,
@@ -86,7 +207,22 @@ class SessionResult:
                 }
                 for t in self.aggregated_trades
             ] if self.aggregated_trades else [],
+            "round_trips": [
+                {
+                    "token_address": t.token_address,
+                    "token_symbol": t.token_symbol,
+                    "buy_signature": t.buy_signature,
+                    "sell_signature": t.sell_signature,
+                    "amount": t.amount,
+                    "profit_usd": t.profit_usd,
+                    "duration_secs": t.duration_secs
+                }
+                for t in self.round_trips
+            ] if self.round_trips else [],
         }
+        if self.profile is not None:
+            result["profile"] = self.profile
+        return result
 
     def _trade_to_dict(self, trade) -> dict:
         return {
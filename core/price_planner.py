@@ -0,0 +1,43 @@
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+# Birdeye returns at most this many 1m candles per history_price call
+MAX_CANDLES_PER_REQUEST = 1000
+
+def coalesce_ranges(ranges: List[Tuple[int, int]], max_span: int = MAX_CANDLES_PER_REQUEST) -> List[Tuple[int, int]]:
+    """
+    Merge inclusive minute ranges into as few requests as possible. Ranges are
+    merged, gaps included, as long as the result spans at most max_span
+    minutes; a single range longer than that is split.
+    """
+    planned: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if planned and end - planned[-1][0] + 1 <= max_span:
+            planned[-1] = (planned[-1][0], max(planned[-1][1], end))
+            continue
+        if planned and start <= planned[-1][1]:
+            # Overlaps a full request: only the remainder still needs fetching
+            start = planned[-1][1] + 1
+            if start > end:
+                continue
+        while end - start + 1 > max_span:
+            planned.append((start, start + max_span - 1))
+            start += max_span
+        planned.append((start, end))
+    return planned
+
+def nearest_price(
+    times: Sequence[int],
+    prices: Sequence[float],
+    target: int,
+    max_distance: Optional[int] = None
+) -> Optional[float]:
+    """Price of the candle closest to target, given candle times sorted ascending."""
+    if not times:
+        return None
+    idx = bisect_left(times, target)
+    candidates = [i for i in (idx - 1, idx) if 0 <= i < len(times)]
+    best = min(candidates, key=lambda i: abs(times[i] - target))
+    if max_distance is not None and abs(times[best] - target) > max_distance:
+        return None
+    return prices[best]
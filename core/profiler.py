@@ -0,0 +1,123 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+class Profile:
+    """
+    Aggregated timings and counters for one session: nested spans keyed by
+    their path ("fetch_page/transfers_chunk"), HTTP calls per provider and
+    SQLite statements. Span totals add up concurrent work, so a stage whose
+    chunks overlap can exceed its wall time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.http: Dict[str, Dict[str, float]] = {}
+        self.sql_statements = 0
+        self._lock = threading.Lock()
+
+    def record_span(self, path: str, elapsed: float):
+        with self._lock:
+            stats = self.spans.setdefault(path, {"count": 0, "total_secs": 0.0, "max_secs": 0.0})
+            stats["count"] += 1
+            stats["total_secs"] += elapsed
+            stats["max_secs"] = max(stats["max_secs"], elapsed)
+
+    def record_http(self, provider: str, elapsed: float, bytes_sent: int, bytes_received: int, status_code: int, retried: bool):
+        with self._lock:
+            stats = self.http.setdefault(provider, {
+                "calls": 0, "retries": 0, "errors": 0,
+                "bytes_sent": 0, "bytes_received": 0, "total_secs": 0.0
+            })
+            stats["calls"] += 1
+            stats["retries"] += retried
+            stats["errors"] += status_code >= 400
+            stats["bytes_sent"] += bytes_sent
+            stats["bytes_received"] += bytes_received
+            stats["total_secs"] += elapsed
+
+    def record_sql(self):
+        with self._lock:
+            self.sql_statements += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "wall_secs": round(time.perf_counter() - self.started, 3),
+                "spans": {
+                    path: {
+                        "count": int(s["count"]),
+                        "total_secs": round(s["total_secs"], 3),
+                        "max_secs": round(s["max_secs"], 3)
+                    }
+                    for path, s in sorted(self.spans.items())
+                },
+                "http": {
+                    provider: {k: (round(v, 3) if k == "total_secs" else int(v)) for k, v in s.items()}
+                    for provider, s in sorted(self.http.items())
+                },
+                "sql": {"statements": self.sql_statements}
+            }
+
+# Context variables follow asyncio tasks and asyncio.to_thread, so every
+# stage of a session sees its profile without it being passed around
+_profile: ContextVar[Optional[Profile]] = ContextVar("profile", default=None)
+_span_path: ContextVar[str] = ContextVar("span_path", default="")
+
+def current_profile() -> Optional[Profile]:
+    return _profile.get()
+
+@contextmanager
+def profiling(profile: Optional[Profile]):
+    """Make profile the active one for the enclosed code (None disables recording)."""
+    token = _profile.set(profile)
+    path_token = _span_path.set("")
+    try:
+        yield profile
+    finally:
+        _span_path.reset(path_token)
+        _profile.reset(token)
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as a child of the current span."""
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    parent = _span_path.get()
+    path = f"{parent}/{name}" if parent else name
+    token = _span_path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.record_span(path, time.perf_counter() - start)
+        _span_path.reset(token)
+
+def record_http(provider: str, response, elapsed: float, retried: bool = False):
+    profile = _profile.get()
+    if profile is None:
+        return
+    body = getattr(response.request, "body", None) or b""
+    profile.record_http(
+        provider,
+        elapsed,
+        bytes_sent=len(body),
+        bytes_received=len(response.content or b""),
+        status_code=response.status_code,
+        retried=retried
+    )
+
+def _count_statement(_statement: str):
+    profile = _profile.get()
+    if profile is not None:
+        profile.record_sql()
+
+def trace_sql(conn):
+    """Count every statement run on conn against the active profile."""
+    conn.set_trace_callback(_count_statement)
+    return conn
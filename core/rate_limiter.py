@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .deadline import Deadline, DeadlineExceeded
+
+RATE_LIMIT_DB = "/var/data/rate_limits.db"
+
+# provider -> (tokens refilled per second, bucket capacity)
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "solanafm": (4.0, 4.0),
+    "birdeye": (1.0, 1.0),
+    "raydium": (5.0, 5.0),
+}
+
+class RateLimiter:
+    """
+    Token buckets per API provider, shared by every bot process through a
+    small SQLite file. Each acquire() refills the bucket from the elapsed time
+    and takes one token inside a single write transaction, so all processes
+    together stay within the provider's quota.
+    """
+
+    def __init__(self, db_path: str = RATE_LIMIT_DB, limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.db_path = db_path
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                provider TEXT PRIMARY KEY,
+                tokens REAL,
+                updated_at REAL,
+                blocked_until REAL
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _try_acquire(self, provider: str) -> float:
+        """Take a token if one is available. Returns 0 on success, else seconds to wait."""
+        rate, capacity = self.limits[provider]
+        conn = self._connect()
+        now = time.time()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE provider = ?",
+                (provider,)
+            ).fetchone()
+            tokens, updated_at, blocked_until = row if row else (capacity, now, 0.0)
+
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+
+            conn.execute("""
+                INSERT INTO buckets (provider, tokens, updated_at, blocked_until)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(provider) DO UPDATE SET
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at
+            """, (provider, tokens, now, blocked_until))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, provider: str, deadline: Optional[Deadline] = None):
+        """Block until a request to the provider is allowed, but not past the deadline."""
+        while True:
+            if deadline is not None:
+                deadline.check()
+            wait = self._try_acquire(provider)
+            if wait <= 0:
+                return
+            if deadline is not None and wait > deadline.remaining():
+                raise DeadlineExceeded(f"{provider} rate limit frees up after the deadline")
+            time.sleep(wait)
+
+    def penalize(self, provider: str, retry_after: float):
+        """Pause the provider for every process, e.g. after a 429 with Retry-After."""
+        conn = self._connect()
+        blocked_until = time.time() + retry_after
+        conn.execute("""
+            INSERT INTO buckets (provider, tokens, updated_at, blocked_until)
+            VALUES (?, 0, ?, ?)
+            ON CONFLICT(provider) DO UPDATE SET
+                tokens = 0,
+                updated_at = excluded.updated_at,
+                blocked_until = MAX(blocked_until, excluded.blocked_until)
+        """, (provider, time.time(), blocked_until))
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter backed by the shared state file."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
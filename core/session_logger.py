@@ -1,27 +1,132 @@
+import atexit
+import json
 import os
+import queue
+import threading
+from collections import defaultdict, deque
 from datetime import datetime
+from typing import Dict, List, Optional
+
+# Most recent messages kept in memory per logger
+MAX_MESSAGES = 1000
+# Lines written per batch before the writer goes back to the queue
+BATCH_SIZE = 500
+
+class _LogWriter:
+    """
+    One background thread per process that drains queued log lines, grouping
+    them by file so each batch costs one open/append per session log.
+    """
+
+    def __init__(self):
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[tuple]):
+        by_path: Dict[str, List[str]] = defaultdict(list)
+        console: List[str] = []
+        flushed: List[threading.Event] = []
+
+        for path, line, console_line in batch:
+            if isinstance(line, threading.Event):
+                flushed.append(line)
+                continue
+            by_path[path].append(line)
+            if console_line is not None:
+                console.append(console_line)
+
+        for path, lines in by_path.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                print(f"Failed to write session log {path}: {e}")
+        if console:
+            print("\n".join(console), flush=True)
+        # Markers are set only after every line queued before them is on disk
+        for event in flushed:
+            event.set()
+
+    def put(self, path: str, line: str, console_line: Optional[str]):
+        self.queue.put((path, line, console_line))
+
+    def flush(self, timeout: Optional[float] = None):
+        marker = threading.Event()
+        self.queue.put((None, marker, None))
+        marker.wait(timeout)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer() -> _LogWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _LogWriter()
+            atexit.register(_writer.flush, 5)
+        return _writer
 
 class SessionLogger:
-    def __init__(self, session_id: str, log_folder: str = "/var/data/logs/"):
+    """
+    Session log that never blocks the caller on I/O: log() formats the line,
+    keeps it in a bounded ring buffer and hands it to the shared background
+    writer, which appends to the log file and echoes to the console.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        log_folder: str = "/var/data/logs/",
+        json_lines: bool = False,
+        echo: bool = True,
+        max_messages: int = MAX_MESSAGES
+    ):
         self.session_id = session_id
         self.log_folder = log_folder
         os.makedirs(log_folder, exist_ok=True)
         self.log_file_path = os.path.join(log_folder, f"session_{session_id}.log")
-        self.messages = []
+        self.json_lines = json_lines
+        self.echo = echo
+        self.messages = deque(maxlen=max_messages)
+        self._writer = _get_writer()
 
     def log(self, message: str, level: str = "INFO"):
         timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
         formatted_message = f"{timestamp} [{level}] {message}"
+        self.messages.append(formatted_message)
 
-        # ✅ Print safe version to console (strip emojis for Windows)
-        safe_console_message = formatted_message.encode("ascii", errors="ignore").decode()
-        print(safe_console_message)
+        if self.json_lines:
+            line = json.dumps({
+                "timestamp": timestamp,
+                "level": level,
+                "session_id": self.session_id,
+                "message": message
+            }, ensure_ascii=False)
+        else:
+            line = formatted_message
 
-        # ✅ Save full version (with emojis) to memory and UTF-8 file
-        self.messages.append(formatted_message)
-        with open(self.log_file_path, "a", encoding="utf-8") as f:
-            f.write(formatted_message + "\n")
+        # ✅ Console gets a safe version (emojis stripped for Windows), the file keeps the full UTF-8 line
+        console_line = formatted_message.encode("ascii", errors="ignore").decode() if self.echo else None
+        self._writer.put(self.log_file_path, line + "\n", console_line)
+
+    def flush(self, timeout: Optional[float] = 10):
+        """Block until everything logged so far is written to the file."""
+        self._writer.flush(timeout)
+
+    def close(self):
+        self.flush()
 
     def get_log(self) -> str:
-        """Return the full log as a single string."""
+        """Return the buffered (most recent) log as a single string."""
         return "\n".join(self.messages)
@@ -1,7 +1,5 @@
 import json
 import os
-import threading
-import time
 from pathlib import Path
 from typing import Set
 from filelock import FileLock, Timeout
@@ -43,11 +41,3 @@ def delete_db(db_path: str):
             print(f"Deleted temporary DB: {db_path}")
     except Exception as e:
         print(f"Failed to delete DB {db_path}: {e}")
-
-def kill_session_after(timeout_secs: int):
-    def killer():
-        time.sleep(timeout_secs)
-        print(f"Session exceeded {timeout_secs} seconds. Force killing...")
-        os._exit(1)
-
-    threading.Thread(target=killer, daemon=True).start()
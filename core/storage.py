@@ -1,7 +1,12 @@
 import sqlite3
+import threading
+import time
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import os
 
+from .profiler import trace_sql
+
 def init_db(path: str):
     Path(path).parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(path)
@@ -10,6 +15,7 @@ def init_db(path: str):
     # Table for logging buys/sells
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS raw_transfers (
+            signature TEXT,
             timestamp INTEGER,
             token TEXT,
             amount REAL,
@@ -20,10 +26,18 @@ def init_db(path: str):
             amount_human REAL,
             price_usd REAL,
             amount_usd REAL,
-            market_cap_usd REAL
+            market_cap_usd REAL,
+            entry_index INTEGER
         )
     """)
 
+    # Re-synced wallets may see the same transfer twice. Keyed on the leg's
+    # position in its transaction, so repeated identical legs are all kept
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_transfers_leg
+        ON raw_transfers (signature, entry_index)
+    """)
+
     # Table for storing last fetched page
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS progress (
@@ -35,53 +49,244 @@ def init_db(path: str):
     conn.commit()
     conn.close()
 
-def insert_raw_transfer(tx: dict, db_path: str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO raw_transfers (
-            timestamp, token, amount, action,
-            token_symbol, token_name, decimals, amount_human,
-            price_usd, amount_usd, market_cap_usd
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        tx["timestamp"],
-        tx.get("token", ""),
-        tx.get("amount", 0),
-        tx["action"],
-        tx.get("token_symbol"),
-        tx.get("token_name"),
-        tx.get("decimals"),
-        tx.get("amount_human"),
-        tx.get("price_usd"),
-        tx.get("amount_usd"),
-        tx.get("market_cap_usd")
-    ))
-    conn.commit()
-    conn.close()
+TRADE_ROWS_SELECT = """
+    SELECT
+        rowid,
+        timestamp,
+        token,
+        token_symbol,
+        amount,
+        amount_usd,
+        market_cap_usd,
+        action,
+        NULL
+    FROM raw_transfers
+    WHERE action IN ('BUY', 'SELL')
+"""
+TRADE_ROWS_QUERY = TRADE_ROWS_SELECT + "ORDER BY timestamp ASC"
+PRICED_TRADE_ROWS_QUERY = TRADE_ROWS_SELECT + "AND price_usd IS NOT NULL ORDER BY timestamp ASC"
 
-def save_last_page(db_path: str, page: int):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO progress (key, value)
-        VALUES ('last_page', ?)
-        ON CONFLICT(key) DO UPDATE SET value = excluded.value
-    """, (str(page),))
-    conn.commit()
-    conn.close()
+class TransferStore:
+    """
+    Session-scoped access to a raw_transfers database. Holds a single WAL-mode
+    connection and writes whole pages / enrichment results in one transaction
+    each, instead of a connection and commit per row.
+    """
 
-def load_last_page(db_path: str) -> int:
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT value FROM progress WHERE key = 'last_page'")
-        row = cursor.fetchone()
-        conn.close()
-        return int(row[0]) if row else 1
-    except Exception as e:
-        print("Failed to load last page progress:", e)
-        return 1
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        init_db(db_path)
+        # The pipeline stores pages from worker threads; the lock serializes access
+        self.conn = trace_sql(sqlite3.connect(db_path, check_same_thread=False))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    def insert_transfers(self, transfers: List[dict]):
+        rows = [(
+            tx.get("signature"),
+            tx["timestamp"],
+            tx.get("token", ""),
+            tx.get("amount", 0),
+            tx["action"],
+            tx.get("token_symbol"),
+            tx.get("token_name"),
+            tx.get("decimals"),
+            tx.get("amount_human"),
+            tx.get("price_usd"),
+            tx.get("amount_usd"),
+            tx.get("market_cap_usd"),
+            tx.get("entry_index")
+        ) for tx in transfers]
+
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO raw_transfers (
+                    signature, timestamp, token, amount, action,
+                    token_symbol, token_name, decimals, amount_human,
+                    price_usd, amount_usd, market_cap_usd, entry_index
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+    def update_metadata(self, metadata: List[dict]):
+        """Apply symbol/name/decimals for each token and derive amount_human."""
+        rows = [(
+            token["symbol"],
+            token["name"],
+            token["decimals"],
+            10 ** token["decimals"] if token["decimals"] else 1,
+            token["address"]
+        ) for token in metadata]
+
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                UPDATE raw_transfers
+                SET
+                    token_symbol = ?,
+                    token_name = ?,
+                    decimals = ?,
+                    amount_human = amount / ?
+                WHERE token = ?
+            """, rows)
+
+    def update_prices(self, rows: List[Tuple[float, float, float, int]]):
+        """rows are (price_usd, amount_usd, market_cap_usd, rowid)."""
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                UPDATE raw_transfers
+                SET
+                    price_usd = ?,
+                    amount_usd = ?,
+                    market_cap_usd = ?
+                WHERE rowid = ?
+            """, rows)
+
+    def get_unique_tokens(self) -> List[str]:
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT DISTINCT token FROM raw_transfers WHERE token IS NOT NULL AND token != ''"
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_unpriced_transfers(self) -> List[Tuple[int, str, int, float]]:
+        """(rowid, token, timestamp, amount_human) for every transfer still lacking a price."""
+        with self._lock:
+            cursor = self.conn.execute("""
+                SELECT rowid, token, timestamp, amount_human
+                FROM raw_transfers
+                WHERE price_usd IS NULL
+                AND token IS NOT NULL
+                AND amount_human IS NOT NULL
+            """)
+            return cursor.fetchall()
+
+    def count_valid_transfers(self) -> int:
+        """Count BUY/SELL transfers with usable metadata."""
+        with self._lock:
+            cursor = self.conn.execute("""
+                SELECT COUNT(*) FROM raw_transfers
+                WHERE action IN ('BUY', 'SELL')
+                AND decimals IS NOT NULL AND decimals > 0
+                AND token_symbol IS NOT NULL
+                AND token_symbol NOT LIKE 'UNKNOWN_%'
+                AND token_symbol != ''
+                AND token IS NOT NULL
+            """)
+            return cursor.fetchone()[0]
+
+    def count_trade_rows(self) -> int:
+        with self._lock:
+            cursor = self.conn.execute("SELECT COUNT(*) FROM raw_transfers WHERE action IN ('BUY', 'SELL')")
+            return cursor.fetchone()[0]
+
+    def load_trade_rows(self) -> List[tuple]:
+        """BUY/SELL rows in time order, shaped for the analyzer."""
+        with self._lock:
+            return self.conn.execute(TRADE_ROWS_QUERY).fetchall()
+
+    def load_priced_trade_rows(self) -> List[tuple]:
+        """load_trade_rows limited to transfers that already have a price."""
+        with self._lock:
+            return self.conn.execute(PRICED_TRADE_ROWS_QUERY).fetchall()
+
+    def load_trade_rows_by_id(self, rowids: List[int], chunk_size: int = 500) -> List[tuple]:
+        """load_trade_rows limited to the given rowids, e.g. a batch that was just priced."""
+        rows = []
+        with self._lock:
+            for i in range(0, len(rowids), chunk_size):
+                chunk = rowids[i:i + chunk_size]
+                placeholders = ",".join("?" for _ in chunk)
+                rows.extend(self.conn.execute(f"{TRADE_ROWS_SELECT} AND rowid IN ({placeholders})", chunk))
+        return sorted(rows, key=lambda row: row[1])
+
+    def trade_rows_cursor(self) -> sqlite3.Cursor:
+        """Open cursor over the load_trade_rows() query, e.g. for TransactionBatch.from_cursor."""
+        with self._lock:
+            return self.conn.execute(TRADE_ROWS_QUERY)
+
+    def iter_trade_rows(self, batch_size: int = 1000) -> Iterator[List[tuple]]:
+        """Same rows as load_trade_rows, in batches, without materializing them all."""
+        with self._lock:
+            cursor = self.conn.execute(TRADE_ROWS_QUERY)
+        while True:
+            with self._lock:
+                batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def _set_progress(self, values: Dict[str, str]):
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO progress (key, value)
+                VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, list(values.items()))
+
+    def _get_progress(self, *keys: str) -> Dict[str, str]:
+        placeholders = ",".join("?" for _ in keys)
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT key, value FROM progress WHERE key IN ({placeholders})", keys
+            )
+            return dict(cursor.fetchall())
+
+    def save_last_page(self, page: int):
+        self._set_progress({"last_page": str(page)})
+
+    def load_last_page(self) -> int:
+        value = self._get_progress("last_page").get("last_page")
+        return int(value) if value else 1
+
+    def load_sync_state(self) -> Tuple[Optional[str], Optional[int]]:
+        state = self._get_progress("last_signature", "last_timestamp")
+        timestamp = int(state["last_timestamp"]) if "last_timestamp" in state else None
+        return state.get("last_signature"), timestamp
+
+    def save_sync_cursor(self, next_page: int, signature: str, timestamp: Optional[int]):
+        """
+        Where an unfinished re-sync stopped, and the mark it sets once it
+        reaches the old one. Newer transfers only push older ones to later
+        pages, so resuming at the same page number never skips any.
+        """
+        self._set_progress({
+            "sync_next_page": str(next_page),
+            "sync_pending_signature": signature,
+            "sync_pending_timestamp": str(timestamp or 0)
+        })
+
+    def load_sync_cursor(self) -> Optional[Tuple[int, str, Optional[int]]]:
+        state = self._get_progress("sync_next_page", "sync_pending_signature", "sync_pending_timestamp")
+        if "sync_next_page" not in state:
+            return None
+        return int(state["sync_next_page"]), state["sync_pending_signature"], int(state["sync_pending_timestamp"]) or None
+
+    def finish_sync(self, signature: str, timestamp: Optional[int]):
+        """Advance the high-water mark and drop the resume cursor in one transaction."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)",
+                [("last_signature", signature), ("last_timestamp", str(timestamp or 0))]
+            )
+            self.conn.execute(
+                "DELETE FROM progress WHERE key IN ('sync_next_page', 'sync_pending_signature', 'sync_pending_timestamp')"
+            )
+
+    def mark_stage_done(self, session_id: str, stage: str):
+        """Checkpoint a finished pipeline stage so a retried session can skip it."""
+        self._set_progress({f"stage:{session_id}:{stage}": str(int(time.time()))})
+
+    def completed_stages(self, session_id: str) -> Set[str]:
+        prefix = f"stage:{session_id}:"
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT key FROM progress WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+            return {key[len(prefix):] for (key,) in cursor.fetchall()}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
 
 def delete_db(db_path: str):
     """Delete a session-specific database after it is finished."""
@@ -89,5 +294,9 @@ def delete_db(db_path: str):
         if os.path.exists(db_path):
             os.remove(db_path)
             print(f"Deleted temporary database: {db_path}")
+        # WAL side files
+        for path in (f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
     except Exception as e:
         print(f"Failed to delete database {db_path}: {e}")
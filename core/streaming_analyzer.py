@@ -0,0 +1,282 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from .analyzer import TradeAnalyzer
+from .lot_matcher import LotMatcher
+from .models import Transaction, TokenTradeAggregate, SessionResult
+
+class RunningMedian:
+    """Two-heap median that supports removing a previously added value (lazy deletion)."""
+
+    def __init__(self):
+        self.low: List[float] = []   # max-heap (negated)
+        self.high: List[float] = []  # min-heap
+        self.low_size = 0
+        self.high_size = 0
+        self.pending = Counter()
+
+    def __len__(self):
+        return self.low_size + self.high_size
+
+    def _prune(self, heap: List[float], negate: bool):
+        while heap:
+            value = -heap[0] if negate else heap[0]
+            if not self.pending[value]:
+                return
+            self.pending[value] -= 1
+            heapq.heappop(heap)
+
+    def _rebalance(self):
+        if self.low_size > self.high_size + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+            self.low_size -= 1
+            self.high_size += 1
+            self._prune(self.low, negate=True)
+        elif self.high_size > self.low_size:
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+            self.high_size -= 1
+            self.low_size += 1
+            self._prune(self.high, negate=False)
+
+    def add(self, value: float):
+        if not self.low or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+            self.low_size += 1
+        else:
+            heapq.heappush(self.high, value)
+            self.high_size += 1
+        self._rebalance()
+
+    def remove(self, value: float):
+        self.pending[value] += 1
+        if self.low and value <= -self.low[0]:
+            self.low_size -= 1
+            if value == -self.low[0]:
+                self._prune(self.low, negate=True)
+        else:
+            self.high_size -= 1
+            if self.high and value == self.high[0]:
+                self._prune(self.high, negate=False)
+        self._rebalance()
+
+    def median(self) -> float:
+        if not len(self):
+            return 0
+        if self.low_size > self.high_size:
+            return -self.low[0]
+        return (-self.low[0] + self.high[0]) / 2
+
+class _TokenState:
+    __slots__ = (
+        "buy_usd", "sell_usd", "total_buys", "total_sells",
+        "first_buy", "first_sell", "last_sell_ts", "first_ts", "arrival",
+        "aggregate"
+    )
+
+    def __init__(self, first_ts: datetime, arrival: int):
+        self.buy_usd = 0.0
+        self.sell_usd = 0.0
+        self.total_buys = 0
+        self.total_sells = 0
+        self.first_buy: Optional[Transaction] = None
+        self.first_sell: Optional[Transaction] = None
+        self.last_sell_ts: Optional[datetime] = None
+        self.first_ts = first_ts
+        self.arrival = arrival
+        self.aggregate: Optional[TokenTradeAggregate] = None
+
+class StreamingTradeAnalyzer(TradeAnalyzer):
+    """
+    Incremental TradeAnalyzer: transfers are fed in batches (in any order) and
+    per-token aggregates, win count, hold-time mean/median, Pearson sums and
+    per-symbol profit are kept up to date. Only one small state object per
+    token is retained, not the transactions themselves, and analyze() or
+    snapshot() can be called at any point for a partial result. Round trips
+    are matched as transfers arrive, so they need batches fed in time order.
+    """
+
+    def __init__(self, top_k: int = 3, lot_method: str = "fifo"):
+        self.top_k = top_k
+        self.lots = LotMatcher(lot_method)
+        self.tokens: Dict[str, _TokenState] = {}
+        self.transfer_count = 0
+        self.first_ts: Optional[datetime] = None
+        self.last_ts: Optional[datetime] = None
+
+        self.total_profit = 0.0
+        self.win_count = 0
+        self.hold_sum = 0.0
+        self.hold_median = RunningMedian()
+        self.symbol_profits: Dict[str, float] = defaultdict(float)
+        # Running sums over (market cap, profit) pairs for the correlation
+        self.corr_n = 0
+        self.corr_x = self.corr_y = self.corr_xx = self.corr_yy = self.corr_xy = 0.0
+
+    @property
+    def aggregated_trades(self) -> List[TokenTradeAggregate]:
+        # Tokens in order of their earliest transfer, as TradeAnalyzer does
+        states = sorted(self.tokens.values(), key=lambda s: (s.first_ts, s.arrival))
+        return [s.aggregate for s in states if s.aggregate is not None]
+
+    def add_batch(self, transactions: Iterable[Transaction]):
+        touched = set()
+        for tx in transactions:
+            self._add(tx)
+            touched.add(tx.token_address)
+        for token in touched:
+            self._refresh(token)
+
+    def _add(self, tx: Transaction):
+        self.transfer_count += 1
+        self.lots.add(tx)
+        if self.first_ts is None or tx.timestamp < self.first_ts:
+            self.first_ts = tx.timestamp
+        if self.last_ts is None or tx.timestamp > self.last_ts:
+            self.last_ts = tx.timestamp
+
+        state = self.tokens.get(tx.token_address)
+        if state is None:
+            state = self.tokens[tx.token_address] = _TokenState(tx.timestamp, len(self.tokens))
+        elif tx.timestamp < state.first_ts:
+            state.first_ts = tx.timestamp
+
+        if tx.type == "BUY":
+            state.buy_usd += tx.amount_usd or 0
+            state.total_buys += 1
+            if state.first_buy is None or tx.timestamp < state.first_buy.timestamp:
+                state.first_buy = tx
+        elif tx.type == "SELL":
+            state.sell_usd += tx.amount_usd or 0
+            state.total_sells += 1
+            if state.first_sell is None or tx.timestamp < state.first_sell.timestamp:
+                state.first_sell = tx
+            if state.last_sell_ts is None or tx.timestamp > state.last_sell_ts:
+                state.last_sell_ts = tx.timestamp
+
+    def _refresh(self, token: str):
+        """Swap a token's previous contribution to the running totals for its current one."""
+        state = self.tokens[token]
+        if state.aggregate is not None:
+            self._apply(state.aggregate, sign=-1)
+        if not state.total_buys or not state.total_sells:
+            return
+
+        buy, sell = state.first_buy, state.first_sell
+        state.aggregate = TokenTradeAggregate(
+            token=token,
+            profit_usd=round(state.sell_usd - state.buy_usd, 4),
+            duration_secs=(state.last_sell_ts - buy.timestamp).total_seconds(),
+            symbol=(buy.token_symbol or sell.token_symbol or "UNKNOWN"),
+            total_buys=state.total_buys,
+            total_sells=state.total_sells,
+            market_cap_usd=buy.market_cap_usd
+        )
+        self._apply(state.aggregate, sign=1)
+
+    def _apply(self, trade: TokenTradeAggregate, sign: int):
+        self.total_profit += sign * trade.profit_usd
+        self.win_count += sign * (trade.profit_usd > 0)
+        self.hold_sum += sign * trade.duration_secs
+        if sign > 0:
+            self.hold_median.add(trade.duration_secs)
+        else:
+            self.hold_median.remove(trade.duration_secs)
+
+        self.symbol_profits[trade.symbol] += sign * trade.profit_usd
+
+        if trade.market_cap_usd is not None:
+            x, y = trade.market_cap_usd, trade.profit_usd
+            self.corr_n += sign
+            self.corr_x += sign * x
+            self.corr_y += sign * y
+            self.corr_xx += sign * x * x
+            self.corr_yy += sign * y * y
+            self.corr_xy += sign * x * y
+
+    def _correlation(self) -> Optional[float]:
+        n = self.corr_n
+        if n < 2:
+            return None
+        numerator = n * self.corr_xy - self.corr_x * self.corr_y
+        variance = (n * self.corr_xx - self.corr_x ** 2) * (n * self.corr_yy - self.corr_y ** 2)
+        if variance <= 0:
+            return None
+        return round(numerator / math.sqrt(variance), 4)
+
+    def _pick(self, heap: List[tuple], trades: List[TokenTradeAggregate], seen_symbols: set) -> List[TokenTradeAggregate]:
+        """Pop trades best-first until top_k distinct symbols are picked."""
+        picked = []
+        while heap and len(picked) < self.top_k:
+            trade = trades[heapq.heappop(heap)[-1]]
+            if trade.symbol not in seen_symbols:
+                picked.append(trade)
+                seen_symbols.add(trade.symbol)
+        return picked
+
+    def _top_trades(self, trades: List[TokenTradeAggregate]):
+        """Top-k best/worst trades without duplicate symbols, same tie-breaking as TradeAnalyzer."""
+        worst_heap = [(t.profit_usd, i) for i, t in enumerate(trades)]
+        best_heap = [(-t.profit_usd, -i, i) for i, t in enumerate(trades)]
+        heapq.heapify(worst_heap)
+        heapq.heapify(best_heap)
+
+        seen_symbols = set()
+        worst_trades = self._pick(worst_heap, trades, seen_symbols)
+        best_trades = self._pick(best_heap, trades, seen_symbols)
+        return best_trades, worst_trades
+
+    def analyze(self) -> Dict:
+        trades = self.aggregated_trades
+        n = len(trades)
+        best_trades, worst_trades = self._top_trades(trades)
+
+        # Best and Worst Tokens by total profit, symbols in order of first appearance
+        symbol_profits = {}
+        for trade in trades:
+            symbol_profits.setdefault(trade.symbol, self.symbol_profits[trade.symbol])
+        best_token = worst_token = None
+        if len(symbol_profits) > 2:
+            best_token = max(symbol_profits.items(), key=lambda x: x[1])
+            worst_token = min(symbol_profits.items(), key=lambda x: x[1])
+
+        return {
+            "total_profit_usd": round(self.total_profit, 4),
+            "win_rate": round(self.win_count / n, 4) if n else 0.0,
+            "average_hold_time_human": self.calculate_human_readable_time(self.hold_sum / n if n else 0),
+            "median_hold_time_human": self.calculate_human_readable_time(self.hold_median.median()),
+            "best_trades": best_trades,
+            "worst_trades": worst_trades,
+            "profit_vs_market_cap_correlation": self._correlation(),
+            "best_token_by_profit": best_token,
+            "worst_token_by_profit": worst_token,
+            "start_date": self.first_ts.strftime("%Y-%m-%d") if self.first_ts else None,
+            "end_date": self.last_ts.strftime("%Y-%m-%d") if self.last_ts else None,
+            "aggregated_trades": trades,
+            "round_trips": self.lots.trades
+        }
+
+    def snapshot(self, session_id: str, wallet_address: str, timestamp_started: str) -> SessionResult:
+        """Partial SessionResult for everything fed so far."""
+        analysis = self.analyze()
+        return SessionResult(
+            session_id=session_id,
+            wallet_address=wallet_address,
+            timestamp_started=timestamp_started,
+            timestamp_ended=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            total_profit_usd=analysis["total_profit_usd"],
+            win_rate=analysis["win_rate"],
+            average_hold_time_human=analysis["average_hold_time_human"],
+            median_hold_time_human=analysis["median_hold_time_human"],
+            profit_vs_market_cap_correlation=analysis["profit_vs_market_cap_correlation"],
+            best_trades=analysis["best_trades"],
+            worst_trades=analysis["worst_trades"],
+            best_token_by_profit=analysis["best_token_by_profit"],
+            worst_token_by_profit=analysis["worst_token_by_profit"],
+            start_date=analysis["start_date"],
+            end_date=analysis["end_date"],
+            aggregated_trades=analysis["aggregated_trades"],
+            round_trips=analysis["round_trips"]
+        )
@@ -1,9 +1,15 @@
-import requests
-import time
+import asyncio
 from typing import List, Dict, Tuple, Optional
 
+from .deadline import Deadline
+from .http_client import send_request
+from .profiler import span
+
+BURN_ADDRESS = "11111111111111111111111111111111"
+WSOL_TOKEN = "So11111111111111111111111111111111111111112"
+
 class SolanaFMRawFetcher:
-    def __init__(self, api_key: str, logger=None):
+    def __init__(self, api_key: str, logger=None, max_concurrency: int = 4):
         self.api_key = api_key
         self.base_url = "https://api.solana.fm"
         self.headers = {
@@ -11,23 +17,98 @@ class SolanaFMRawFetcher:
             "Authorization": f"Bearer {self.api_key}"
         }
         self.limit = 1000  # Max allowed for /transactions endpoint
+        self.chunk_size = 100  # Max hashes per /transfers request
+        self.max_concurrency = max_concurrency
         self.logger = logger
 
-    def fetch_transfers(
-        self,
-        wallet_address: str,
-        page: int = 1
-    ) -> Tuple[List[Dict], List[str]]:
-        """Fetch SPL token transfers from a wallet using page-based batching."""
+    def _fetch_signatures(self, wallet_address: str, page: int, deadline: Optional[Deadline] = None) -> List[str]:
         if self.logger:
             self.logger.log(f"🔎 Fetching transactions page {page} for wallet {wallet_address}")
 
         tx_url = f"{self.base_url}/v0/accounts/{wallet_address}/transactions"
         params = {"page": page, "limit": self.limit}
-        tx_resp = requests.get(tx_url, headers=self.headers, params=params)
-        tx_resp.raise_for_status()
-        tx_data = tx_resp.json().get("result", {}).get("data", [])
-        tx_signatures = [tx["signature"] for tx in tx_data]
+        with span("signatures"):
+            tx_resp = send_request("solanafm", "GET", tx_url, deadline=deadline, headers=self.headers, params=params)
+            tx_resp.raise_for_status()
+            tx_data = tx_resp.json().get("result", {}).get("data", [])
+        return [tx["signature"] for tx in tx_data]
+
+    def _post_transfer_chunk(self, chunk: List[str], deadline: Optional[Deadline] = None) -> dict:
+        with span("transfers_chunk"):
+            transfer_resp = send_request(
+                "solanafm",
+                "POST",
+                f"{self.base_url}/v0/transfers",
+                deadline=deadline,
+                headers=self.headers,
+                json={"transactionHashes": chunk}
+            )
+            transfer_resp.raise_for_status()
+            return transfer_resp.json()
+
+    def _parse_transfers(self, payload: dict, wallet_address: str) -> List[Dict]:
+        """Turn a /transfers response into BUY/SELL rows for the wallet."""
+        valid_transfers = []
+        for tx in payload.get("result", []):
+            tx_hash = tx.get("transactionHash")
+            for entry_index, entry in enumerate(tx.get("data", [])):
+                if entry.get("action") not in ["transfer", "transferChecked"]:
+                    continue
+                if not entry.get("token"):
+                    continue
+
+                source = entry.get("source") or ""
+                destination = entry.get("destination") or ""
+
+                # ❌ Exclude burn/mint transfers and WSOL
+                if source == BURN_ADDRESS or destination == BURN_ADDRESS:
+                    continue
+                if entry.get("token") == WSOL_TOKEN:
+                    continue
+
+                action = None
+                if destination == wallet_address:
+                    action = "BUY"
+                elif source == wallet_address:
+                    action = "SELL"
+
+                if action:
+                    valid_transfers.append({
+                        "signature": tx_hash,
+                        "timestamp": entry["timestamp"],
+                        "token": entry.get("token"),
+                        "amount": float(entry.get("amount", 0)),
+                        "source": source,
+                        "destination": destination,
+                        "action": action,
+                        "entry_index": entry_index
+                    })
+        return valid_transfers
+
+    def _truncate_at(self, tx_signatures: List[str], until_signature: Optional[str]) -> List[str]:
+        """Drop the already-synced tail of a newest-first page."""
+        if until_signature and until_signature in tx_signatures:
+            return tx_signatures[:tx_signatures.index(until_signature)]
+        return tx_signatures
+
+    def _chunks(self, tx_signatures: List[str]) -> List[List[str]]:
+        return [
+            tx_signatures[i:i + self.chunk_size]
+            for i in range(0, len(tx_signatures), self.chunk_size)
+        ]
+
+    def fetch_transfers(
+        self,
+        wallet_address: str,
+        page: int = 1,
+        until_signature: Optional[str] = None
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        Fetch SPL token transfers from a wallet using page-based batching.
+        If until_signature is on the page, only transactions newer than it are
+        fetched and the returned signature list is cut there.
+        """
+        tx_signatures = self._truncate_at(self._fetch_signatures(wallet_address, page), until_signature)
 
         if not tx_signatures:
             if self.logger:
@@ -35,51 +116,50 @@ class SolanaFMRawFetcher:
             return [], []
 
         valid_transfers = []
-        for i in range(0, len(tx_signatures), 100):
-            chunk = tx_signatures[i:i + 100]
-            transfer_resp = requests.post(
-                f"{self.base_url}/v0/transfers",
-                headers=self.headers,
-                json={"transactionHashes": chunk}
-            )
-            transfer_resp.raise_for_status()
+        for chunk in self._chunks(tx_signatures):
+            payload = self._post_transfer_chunk(chunk)
+            valid_transfers.extend(self._parse_transfers(payload, wallet_address))
+
+        return valid_transfers, tx_signatures
+
+    async def fetch_transfers_async(
+        self,
+        wallet_address: str,
+        page: int = 1,
+        until_signature: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        Same as fetch_transfers, but posts the /transfers chunks concurrently
+        (at most max_concurrency in flight) and parses each one as it returns.
+        The returned list keeps the original chunk order. A page that cannot
+        finish before the deadline raises DeadlineExceeded rather than being
+        returned half-fetched.
+        """
+        tx_signatures = await asyncio.to_thread(self._fetch_signatures, wallet_address, page, deadline)
+        tx_signatures = self._truncate_at(tx_signatures, until_signature)
+
+        if not tx_signatures:
+            if self.logger:
+                self.logger.log("🚫 No transactions found for page.")
+            return [], []
+
+        chunks = self._chunks(tx_signatures)
+        parsed: List[Optional[List[Dict]]] = [None] * len(chunks)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_chunk(index: int, chunk: List[str]):
+            async with semaphore:
+                payload = await asyncio.to_thread(self._post_transfer_chunk, chunk, deadline)
+            parsed[index] = self._parse_transfers(payload, wallet_address)
 
-            for tx in transfer_resp.json().get("result", []):
-                tx_hash = tx.get("transactionHash")
-                for entry in tx.get("data", []):
-                    if entry.get("action") not in ["transfer", "transferChecked"]:
-                        continue
-                    if not entry.get("token"):
-                        continue
-
-                    source = entry.get("source") or ""
-                    destination = entry.get("destination") or ""
-                    burn_address = "11111111111111111111111111111111"
-                    wsol_token = "So11111111111111111111111111111111111111112"
-
-                    # ❌ Exclude burn/mint transfers and WSOL
-                    if source == burn_address or destination == burn_address:
-                        continue
-                    if entry.get("token") == wsol_token:
-                        continue
-
-                    action = None
-                    if destination == wallet_address:
-                        action = "BUY"
-                    elif source == wallet_address:
-                        action = "SELL"
-
-                    if action:
-                        valid_transfers.append({
-                            "signature": tx_hash,
-                            "timestamp": entry["timestamp"],
-                            "token": entry.get("token"),
-                            "amount": float(entry.get("amount", 0)),
-                            "source": source,
-                            "destination": destination,
-                            "action": action
-                        })
-
-            time.sleep(1)  # Respect API rate limits
+        tasks = [asyncio.create_task(fetch_chunk(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
+        valid_transfers = [tx for chunk_transfers in parsed for tx in chunk_transfers]
         return valid_transfers, tx_signatures
@@ -1,17 +1,20 @@
 import sqlite3
 import logging
+from typing import Optional
 
-def clean_transfer_database(db_path: str):
+from .profiler import trace_sql
+
+def clean_transfer_database(db_path: str, limit: Optional[int] = 50):
     """
-    Keep only the first 50 BUY/SELL transfers that:
+    Keep only the first `limit` BUY/SELL transfers (all of them if limit is None) that:
     - Have valid decimals
     - Do NOT have UNKNOWN symbols
     Everything else will be deleted from the raw_transfers table.
     """
-    conn = sqlite3.connect(db_path)
+    conn = trace_sql(sqlite3.connect(db_path))
     cursor = conn.cursor()
 
-    # Step 1: Find rowids of first 50 transfers with valid decimals and real symbol
+    # Step 1: Find rowids of first `limit` transfers with valid decimals and real symbol
     cursor.execute("""
         SELECT rowid FROM raw_transfers
         WHERE action IN ('BUY', 'SELL')
@@ -19,8 +22,8 @@ def clean_transfer_database(db_path: str):
           AND token_symbol IS NOT NULL
           AND token_symbol NOT LIKE 'UNKNOWN_%'
         ORDER BY timestamp ASC
-        LIMIT 50
-    """)
+        LIMIT ?
+    """, (limit if limit is not None else -1,))
     keep_ids = [str(row[0]) for row in cursor.fetchall()]
 
     if not keep_ids: